@@ -1,10 +1,31 @@
-from flask import Flask
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from config import Config
-from database import init_db
-from routes.api import api_bp
+from database import connect_lazily, create_indexes, init_db
+from routes.api import api_bp, popular_warmer
+from services.event_loop import run_async
+from services.health_prober import health_prober
+from services.metrics import histogram, registry
+from services.wishlist_service import migrate_all_wishlists
 from routes.auth import auth_bp
+from logger import get_logger
 import sys
+import time
+
+log = get_logger('app')
+
+REQUEST_SECONDS = histogram(
+    'wandrix_http_request_seconds',
+    'Time from receiving a request to returning its response (first byte for streams)',
+    ('method', 'route', 'status')
+)
+
+def start_background_services():
+    """Health prober (which triggers the lazy DB connect) and popular-content warm-up; no-ops once running"""
+    health_prober.start()
+    # Pre-generate content for the popular destinations in the background
+    if Config.WARMUP_ENABLED and Config.GEMINI_API_KEY:
+        popular_warmer.start(initial_delay=Config.WARMUP_STARTUP_DELAY_SECONDS)
 
 def create_app():
     """Application factory function"""
@@ -20,16 +41,63 @@ def create_app():
         }
     })
     
-    # Initialize database
-    try:
-        init_db()
-    except Exception as e:
-        print(f"[APP] Database initialization error: {e}")
+    # Initialize database: in the background on first use, or right here
+    if Config.LAZY_STARTUP:
+        connect_lazily()
+    else:
+        try:
+            init_db()
+        except Exception as e:
+            log.error("Database initialization error: %s", e)
     
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     
+    # Request latency per route; url_rule keeps path parameters out of the labels
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        if Config.LAZY_STARTUP:
+            start_background_services()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus text exposition of this process's metrics"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+    
+    # With LAZY_STARTUP these start with each worker's first request instead,
+    # so nothing runs (or connects) in a gunicorn --preload master before the fork
+    if not Config.LAZY_STARTUP:
+        start_background_services()
+    
+    @app.cli.command('warm-popular')
+    def warm_popular():
+        """Generate any missing or stale content for the popular destinations"""
+        summary = run_async(popular_warmer.run_once())
+        log.info("Warm-up finished: %s", summary)
+    
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Create the MongoDB indexes (run once per deployment)"""
+        init_db()
+        if not create_indexes():
+            sys.exit(1)
+    
+    @app.cli.command('migrate-wishlists')
+    def migrate_wishlists_command():
+        """Move wishlists embedded in user documents into the wishlists collection"""
+        summary = migrate_all_wishlists()
+        log.info("Wishlist migration finished: %s", summary)
+    
     @app.route('/')
     def index():
         return {
@@ -37,6 +105,7 @@ def create_app():
             "version": "1.0.0",
             "endpoints": {
                 "health": "/api/health",
+                "metrics": "/metrics",
                 "destination_info": "/api/destination/info",
                 "destination_highlights": "/api/destination/highlights",
                 "compare": "/api/compare",
@@ -48,7 +117,7 @@ def create_app():
     return app
 
 if __name__ == '__main__':
-    print("[APP] Starting Wandrix Backend Server...")
+    log.info("Starting Wandrix Backend Server...")
     app = create_app()
-    print("[APP] Server starting on http://0.0.0.0:5000")
+    log.info("Server starting on http://0.0.0.0:5000")
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True, use_reloader=False)
@@ -11,11 +11,116 @@ class Config:
     
     # Gemini API
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+    # Request schema-constrained JSON (response schemas from models.py)
+    GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'True').lower() == 'true'
     
     # Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
+    # Logging: records are written by a background thread as JSON lines (or "text");
+    # LOG_DEBUG_SAMPLE_RATE keeps only that fraction of DEBUG records
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+    
     # JWT Configuration
     JWT_SECRET = os.getenv('JWT_SECRET', 'wandrix-jwt-secret-key-super-secure-2026')
-    JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
\ No newline at end of file
+    JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
+    # Key set for rotation, "kid1:secret1,kid2:secret2"; new tokens are signed with
+    # JWT_ACTIVE_KID (default: the first key). Tokens without a kid use JWT_SECRET.
+    JWT_KEYS = dict(
+        item.strip().split(':', 1) for item in os.getenv('JWT_KEYS', '').split(',') if ':' in item
+    )
+    JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID', '')
+    # Verified and rejected token caches (per process)
+    TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '4096'))
+    TOKEN_NEGATIVE_CACHE_SECONDS = int(os.getenv('TOKEN_NEGATIVE_CACHE_SECONDS', '60'))
+    
+    # Password hashing runs on a dedicated pool; hashes made with another
+    # method (e.g. pbkdf2:sha256:600000 or scrypt:32768:8:1) are upgraded on login
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32'))
+    
+    # Authenticated user cache (per process); the TTL bounds how long another
+    # worker can serve a user document that was changed elsewhere
+    USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', '60'))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '2048'))
+    
+    # Response caches for Gemini content (destination info/highlights, itineraries, comparisons)
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+    COMPARISON_CACHE_TTL_SECONDS = int(os.getenv('COMPARISON_CACHE_TTL_SECONDS', str(3 * 24 * 3600)))
+    
+    # Itineraries of ITINERARY_ORCHESTRATE_MIN_DAYS or more are generated as
+    # a skeleton call plus concurrent calls for chunks of days
+    # ('auto', 'single' or 'orchestrated')
+    ITINERARY_ORCHESTRATION = os.getenv('ITINERARY_ORCHESTRATION', 'auto').lower()
+    ITINERARY_ORCHESTRATE_MIN_DAYS = int(os.getenv('ITINERARY_ORCHESTRATE_MIN_DAYS', '6'))
+    ITINERARY_CHUNK_DAYS = int(os.getenv('ITINERARY_CHUNK_DAYS', '3'))
+    ITINERARY_CHUNK_CONCURRENCY = int(os.getenv('ITINERARY_CHUNK_CONCURRENCY', '4'))
+    
+    # Page size limits for /api/auth/wishlist (/api/auth/me returns the whole list)
+    WISHLIST_PAGE_SIZE = int(os.getenv('WISHLIST_PAGE_SIZE', '100'))
+    WISHLIST_MAX_PAGE_SIZE = int(os.getenv('WISHLIST_MAX_PAGE_SIZE', '500'))
+    # Max destinations per batch check/add/remove request
+    WISHLIST_BATCH_MAX = int(os.getenv('WISHLIST_BATCH_MAX', '100'))
+    
+    # Page size limits for /api/comparisons/history
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '50'))
+    
+    # Saved itineraries with the same destination and canonical preferences
+    # are served instead of generating a new one while younger than this
+    ITINERARY_REUSE_MAX_AGE_DAYS = float(os.getenv('ITINERARY_REUSE_MAX_AGE_DAYS', '30'))
+    
+    # Max destinations ranked by one /api/compare/batch request
+    COMPARE_BATCH_MAX_DESTINATIONS = int(os.getenv('COMPARE_BATCH_MAX_DESTINATIONS', '10'))
+    
+    # Pre-warming of popular destination content (info, highlights and
+    # itinerary variants); entries expiring within the refresh window are
+    # regenerated, at most WARMUP_MAX_CALLS_PER_RUN Gemini calls per run
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True').lower() == 'true'
+    WARMUP_INTERVAL_SECONDS = int(os.getenv('WARMUP_INTERVAL_SECONDS', str(6 * 3600)))
+    WARMUP_REFRESH_BEFORE_SECONDS = int(os.getenv('WARMUP_REFRESH_BEFORE_SECONDS', str(24 * 3600)))
+    WARMUP_MAX_CALLS_PER_RUN = int(os.getenv('WARMUP_MAX_CALLS_PER_RUN', '30'))
+    WARMUP_STARTUP_DELAY_SECONDS = int(os.getenv('WARMUP_STARTUP_DELAY_SECONDS', '10'))
+    WARMUP_ITINERARY_DURATIONS = [
+        int(d) for d in os.getenv('WARMUP_ITINERARY_DURATIONS', '3,5,7').split(',') if d.strip()
+    ]
+    
+    # Gemini rate limiting (shared by all requests in a worker, or by all
+    # workers on the host when GEMINI_RATE_LIMIT_STATE_FILE is set)
+    GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))
+    GEMINI_BURST = int(os.getenv('GEMINI_BURST', '10'))
+    GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+    GEMINI_MAX_QUEUE = int(os.getenv('GEMINI_MAX_QUEUE', '50'))
+    GEMINI_MAX_QUEUE_WAIT_SECONDS = float(os.getenv('GEMINI_MAX_QUEUE_WAIT_SECONDS', '30'))
+    GEMINI_MAX_BACKOFF_SECONDS = float(os.getenv('GEMINI_MAX_BACKOFF_SECONDS', '60'))
+    GEMINI_RATE_LIMIT_STATE_FILE = os.getenv('GEMINI_RATE_LIMIT_STATE_FILE', '')
+    
+    # Fallback storage used while MongoDB is unavailable: 'sqlite' (WAL mode,
+    # safe with several gunicorn workers) or 'file' (JSON snapshot + operation
+    # log, meant for a single process such as local development)
+    FALLBACK_STORAGE = os.getenv('FALLBACK_STORAGE', 'sqlite').lower()
+    FALLBACK_SQLITE_PATH = os.getenv('FALLBACK_SQLITE_PATH', '')
+    
+    # Background MongoDB reconnection: backoff between attempts while the
+    # circuit is open, and how often a live connection is pinged
+    DB_RECONNECT_MIN_SECONDS = float(os.getenv('DB_RECONNECT_MIN_SECONDS', '5'))
+    DB_RECONNECT_MAX_SECONDS = float(os.getenv('DB_RECONNECT_MAX_SECONDS', '300'))
+    DB_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv('DB_HEALTH_CHECK_INTERVAL_SECONDS', '15'))
+    
+    # Startup: with LAZY_STARTUP each worker connects to MongoDB in the background
+    # when it receives its first request, instead of create_app() blocking on it.
+    # Requests wait at most DB_STARTUP_WAIT_SECONDS for that first attempt
+    LAZY_STARTUP = os.getenv('LAZY_STARTUP', 'True').lower() == 'true'
+    DB_STARTUP_WAIT_SECONDS = float(os.getenv('DB_STARTUP_WAIT_SECONDS', '5'))
+    # Indexes are built by `flask create-indexes`; set to build them on every connect
+    AUTO_CREATE_INDEXES = os.getenv('AUTO_CREATE_INDEXES', 'False').lower() == 'true'
+    
+    # Health probes: /api/health/live and /api/health/ready answer from state a
+    # background prober refreshes every HEALTH_PROBE_INTERVAL_SECONDS
+    HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', '15'))
+    HEALTH_GEMINI_TIMEOUT_SECONDS = float(os.getenv('HEALTH_GEMINI_TIMEOUT_SECONDS', '5'))
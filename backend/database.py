@@ -16,65 +16,140 @@ from pymongo.errors import (
     OperationFailure,
     ConfigurationError,
     NetworkTimeout,
-    AutoReconnect
+    AutoReconnect,
+    BulkWriteError,
+    DuplicateKeyError
 )
+from pymongo import monitoring
 from pymongo.server_api import ServerApi
 from config import Config
+from logger import get_logger
+from services.metrics import FAST_BUCKETS, counter, gauge, histogram
+import bisect
+import copy
 import json
 import os
+import random
+import re
+import sqlite3
 import sys
 import time
 import threading
+import atexit
 import certifi
 from datetime import datetime
 from bson import ObjectId
 from functools import wraps
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the file engine is then single-process only
+    fcntl = None
 
 # ==================== LOGGING & DEBUG ====================
 
-class DatabaseLogger:
-    """Custom logger for database operations with color support"""
-    
-    COLORS = {
-        'GREEN': '\033[92m',
-        'YELLOW': '\033[93m',
-        'RED': '\033[91m',
-        'BLUE': '\033[94m',
-        'CYAN': '\033[96m',
-        'RESET': '\033[0m',
-        'BOLD': '\033[1m'
-    }
-    
-    @staticmethod
-    def _timestamp():
-        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    @classmethod
-    def success(cls, message):
-        print(f"{cls.COLORS['GREEN']}[{cls._timestamp()}] SUCCESS: {message}{cls.COLORS['RESET']}")
-    
-    @classmethod
-    def warning(cls, message):
-        print(f"{cls.COLORS['YELLOW']}[{cls._timestamp()}] WARNING: {message}{cls.COLORS['RESET']}")
-    
-    @classmethod
-    def error(cls, message):
-        print(f"{cls.COLORS['RED']}[{cls._timestamp()}] ERROR: {message}{cls.COLORS['RESET']}")
-    
-    @classmethod
-    def info(cls, message):
-        print(f"{cls.COLORS['BLUE']}[{cls._timestamp()}] INFO: {message}{cls.COLORS['RESET']}")
-    
-    @classmethod
-    def debug(cls, message):
-        if Config.DEBUG:
-            print(f"{cls.COLORS['CYAN']}[{cls._timestamp()}] DEBUG: {message}{cls.COLORS['RESET']}")
-    
-    @classmethod
-    def connection(cls, message):
-        print(f"{cls.COLORS['BOLD']}{cls.COLORS['GREEN']}[{cls._timestamp()}] CONNECTION: {message}{cls.COLORS['RESET']}")
+log = get_logger('database')
+
+# ==================== METRICS ====================
+
+FALLBACK_OPERATION_SECONDS = histogram(
+    'wandrix_fallback_operation_seconds',
+    'Duration of fallback storage operations',
+    ('engine', 'collection', 'operation'),
+    FAST_BUCKETS
+)
+MONGO_COMMAND_SECONDS = histogram(
+    'wandrix_mongodb_command_seconds',
+    'Duration of MongoDB commands as reported by the driver',
+    ('command', 'outcome'),
+    FAST_BUCKETS
+)
+MONGO_POOL_CONNECTIONS = gauge(
+    'wandrix_mongodb_pool_connections',
+    'MongoDB pool connections that are open, and of those checked out by a request',
+    ('state',)
+)
+MONGO_POOL_CHECKOUT_SECONDS = histogram(
+    'wandrix_mongodb_pool_checkout_seconds',
+    'Time spent waiting for a MongoDB pool connection',
+    (),
+    FAST_BUCKETS
+)
+MONGO_POOL_CHECKOUT_FAILURES = counter(
+    'wandrix_mongodb_pool_checkout_failures_total',
+    'MongoDB pool checkouts that failed',
+    ('reason',)
+)
+MONGO_POOL_CLEARED = counter('wandrix_mongodb_pool_cleared_total', 'Times a MongoDB pool was cleared after an error')
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Record the driver-measured duration of every MongoDB command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name, 'succeeded')
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name, 'failed')
 
-log = DatabaseLogger()
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Track open and checked-out connections and checkout wait times"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc('open')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec('open')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc(str(event.reason))
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.inc('checked_out')
+        # duration was added in PyMongo 4.7
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_SECONDS.observe(duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.dec('checked_out')
+
+
+def _timed(operation):
+    """Record how long a fallback collection method takes"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                FALLBACK_OPERATION_SECONDS.observe(time.perf_counter() - started, *self._metric_labels, operation)
+        return wrapper
+    return decorator
 
 # ==================== GLOBAL STATE ====================
 
@@ -84,165 +159,1098 @@ _connection_lock = threading.Lock()
 _last_health_check = None
 _connection_retries = 0
 _max_retries = 3
+# Lazy startup: the process that started the background connect, and whether its first attempt finished
+_lazy_connect = False
+_startup_pid = None
+_startup_lock = threading.Lock()
+_startup_done = threading.Event()
+_startup_done.set()
 _is_connected = False
 
-# File-based fallback storage path
+# File-based fallback storage paths
+FALLBACK_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(os.path.dirname(__file__), 'users.json')
+SQLITE_FILE = Config.FALLBACK_SQLITE_PATH or os.path.join(os.path.dirname(__file__), 'wandrix_fallback.db')
 
 # ==================== FILE-BASED FALLBACK ====================
 
+_MISSING = object()
+
+
+def _json_default(value):
+    """Serialize non-JSON types the same way on insert and on disk"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _normalize_document(document):
+    """Deep-copy a document into its JSON-compatible stored form"""
+    return json.loads(json.dumps(document, default=_json_default))
+
+
+def _normalize_value(value):
+    """Convert a query value to the form documents are stored in"""
+    if isinstance(value, (datetime, ObjectId)):
+        return _json_default(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    return value
+
+
+def _index_key(value):
+    """Hashable form of a field value for the hash indexes"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, default=_json_default)
+    if isinstance(value, (datetime, ObjectId)):
+        return _json_default(value)
+    return value
+
+
+def _sort_key(value):
+    """Total ordering across types (null < numbers < strings < everything else), like MongoDB"""
+    if value is None or value is _MISSING:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (3, str(value))
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, json.dumps(value, sort_keys=True, default=_json_default))
+
+
+def _get_path(document, path):
+    """Resolve a dotted field path ('result.recommendation.winner')"""
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _normalize_index_spec(keys):
+    """Turn 'field' or [('a', 1), ('b', -1)] into a tuple of field names"""
+    if isinstance(keys, str):
+        return (keys,)
+    return tuple(field for field, _direction in keys)
+
+
+def _values_equal(actual, expected):
+    if actual is _MISSING:
+        return expected is None
+    if actual == expected:
+        return True
+    # Like MongoDB, a scalar matches an array field that contains it
+    return isinstance(actual, list) and not isinstance(expected, list) and expected in actual
+
+
+def _match_operator(op, actual, expected):
+    if op == '$exists':
+        return (actual is not _MISSING) == bool(expected)
+    if op == '$ne':
+        return not _values_equal(actual, expected)
+    if op == '$in':
+        return any(_values_equal(actual, v) for v in expected)
+    if op == '$nin':
+        return not any(_values_equal(actual, v) for v in expected)
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        if actual is _MISSING or actual is None:
+            return False
+        try:
+            if op == '$gt':
+                return actual > expected
+            if op == '$gte':
+                return actual >= expected
+            if op == '$lt':
+                return actual < expected
+            return actual <= expected
+        except TypeError:
+            return False
+    raise ValueError(f"Unsupported query operator for fallback storage: {op}")
+
+
+def _is_operator_condition(condition):
+    return isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition)
+
+
+def _matches_query(item, query):
+    """Check if a stored document matches a PyMongo-style query"""
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(_matches_query(item, sub) for sub in condition):
+                return False
+            continue
+        if key == '$and':
+            if not all(_matches_query(item, sub) for sub in condition):
+                return False
+            continue
+
+        actual = _get_path(item, key)
+        if _is_operator_condition(condition):
+            for op, expected in condition.items():
+                expected = _normalize_value(expected)
+                if key == '_id' and op != '$exists':
+                    expected = [str(v) for v in expected] if isinstance(expected, list) else str(expected)
+                if not _match_operator(op, actual, expected):
+                    return False
+        elif key == '_id':
+            if actual != str(condition):
+                return False
+        elif not _values_equal(actual, _normalize_value(condition)):
+            return False
+    return True
+
+
+def _apply_projection(document, projection):
+    """Apply an inclusion ({'a': 1}) or exclusion ({'a': 0}) projection, dotted paths allowed"""
+    if not projection:
+        return document
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+
+    if fields and all(fields.values()):
+        projected = {}
+        for path in fields:
+            value = _get_path(document, path)
+            if value is _MISSING:
+                continue
+            target = projected
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    else:
+        projected = copy.deepcopy(document)
+        for path in fields:
+            target = projected
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.get(part) if isinstance(target, dict) else None
+            if isinstance(target, dict):
+                target.pop(parts[-1], None)
+
+    if include_id and '_id' in document:
+        projected['_id'] = document['_id']
+    elif not include_id:
+        projected.pop('_id', None)
+    return projected
+
+
+def _apply_update(document, update):
+    """Apply $set/$unset/$inc/$push/$addToSet/$pull operators to a stored document in place"""
+    if '$set' in update:
+        for k, v in _normalize_document(update['$set']).items():
+            document[k] = v
+    if '$unset' in update:
+        for k in update['$unset']:
+            document.pop(k, None)
+    if '$inc' in update:
+        for k, v in update['$inc'].items():
+            document[k] = document.get(k, 0) + v
+    if '$push' in update:
+        for k, v in _normalize_document(update['$push']).items():
+            document.setdefault(k, []).append(v)
+    if '$addToSet' in update:
+        for k, v in _normalize_document(update['$addToSet']).items():
+            values = v['$each'] if isinstance(v, dict) and '$each' in v else [v]
+            target = document.setdefault(k, [])
+            for value in values:
+                if value not in target:
+                    target.append(value)
+    if '$pull' in update:
+        for k, v in _normalize_document(update['$pull']).items():
+            if k in document:
+                document[k] = [x for x in document[k] if not _pull_matches(x, v)]
+    document['updated_at'] = datetime.utcnow().isoformat()
+
+
+def _pull_matches(value, condition):
+    """Whether $pull removes an array element: {'$in': [...]}, a subdocument query, or a plain value"""
+    if _is_operator_condition(condition):
+        return all(_match_operator(op, value, expected) for op, expected in condition.items())
+    if isinstance(condition, dict):
+        return isinstance(value, dict) and _matches_query(value, condition)
+    return value == condition
+
+
+def _sort_documents(documents, sort):
+    """Sort documents in place by a list of (field, direction) pairs"""
+    for field, direction in reversed(sort):
+        documents.sort(key=lambda d: _sort_key(_get_path(d, field)), reverse=direction == -1)
+    return documents
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+def _bulk_insert(insert_one, documents, ordered):
+    """insert_many on top of insert_one, reporting duplicates like PyMongo's BulkWriteError"""
+    inserted_ids, write_errors = [], []
+    for index, document in enumerate(documents):
+        try:
+            inserted_ids.append(insert_one(document).inserted_id)
+        except DuplicateKeyError as e:
+            write_errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': document})
+            if ordered:
+                break
+    if write_errors:
+        raise BulkWriteError({
+            'writeErrors': write_errors, 'writeConcernErrors': [], 'nInserted': len(inserted_ids),
+            'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []
+        })
+    return InsertManyResult(inserted_ids)
+
+
+class UpdateResult:
+    def __init__(self, matched, modified, upserted_id=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted):
+        self.deleted_count = deleted
+
+
+class FallbackCursor:
+    """Lazy PyMongo-style cursor supporting sort, skip and limit"""
+
+    def __init__(self, collection, query=None, projection=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _fetch(self):
+        if self._results is None:
+            self._results = self._collection._run_find(
+                self._query, self._sort, self._skip, self._limit, self._projection
+            )
+        return self._results
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+
 class FileBasedCollection:
     """
-    Simple file-based collection for when MongoDB is unavailable.
+    Indexed file-based collection for when MongoDB is unavailable.
     Provides basic CRUD operations compatible with PyMongo interface.
+
+    Documents are held in memory with hash indexes on ``_id`` and any
+    fields passed in ``indexes`` (single or compound), so equality lookups
+    are O(1). Single-field indexes are also kept ordered, so
+    ``find().sort(field).limit(n)`` walks the index instead of sorting.
+    The file itself is a JSON snapshot plus an append-only operation log
+    (``<file>.log``): each write appends one line, fsyncs are batched, and
+    the log is compacted back into the snapshot once it grows past
+    ``compact_threshold`` ops.
+
+    Several processes (gunicorn workers) may share the files: every
+    operation takes an ``fcntl`` lock on ``<file>.lock`` (shared for reads,
+    exclusive for writes) and first replays the log lines other processes
+    appended since its last operation. Compaction runs under the exclusive
+    lock after catching up, so no process's writes are lost. Without
+    ``fcntl`` (Windows) the engine is single-process only.
     """
-    
-    def __init__(self, filename):
+
+    def __init__(self, filename, indexes=(), compact_threshold=1000,
+                 fsync_batch=32, fsync_interval=1.0):
         self.filename = filename
-        self._lock = threading.Lock()
-        self._ensure_file()
-        log.info(f"File-based collection initialized: {filename}")
-    
-    def _ensure_file(self):
-        """Ensure the storage file exists"""
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w') as f:
-                json.dump([], f)
-            log.debug(f"Created storage file: {self.filename}")
-    
-    def _read(self):
-        """Read all documents from file"""
+        self.log_filename = filename + '.log'
+        self.lock_filename = filename + '.lock'
+        self._metric_labels = ('file', os.path.splitext(os.path.basename(filename))[0])
+        self.compact_threshold = compact_threshold
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        self._pid = None
+        self._documents = {}
+        self._indexes = {}
+        self._unique = set()
+        self._ordered = {}
+        self._log_file = None
+        self._log_ino = None
+        self._log_offset = 0
+        self._log_ops = 0
+        self._unsynced_ops = 0
+        self._fsync_timer = None
+        with self._locked(exclusive=True):
+            if not os.path.exists(self.filename):
+                self._write_snapshot([])
+                log.debug("Created storage file: %s", self.filename)
+        for spec in indexes:
+            self.create_index(spec)
+        log.info("File-based collection initialized: %s (%s documents)", filename, len(self._documents))
+
+    # ---------- cross-process consistency ----------
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """
+        Hold the thread lock and the file lock (shared for reads, exclusive for
+        writes), then catch up with writes other processes made since our last
+        operation. Re-entrant: nested calls reuse the outer locks.
+        """
         with self._lock:
+            if self._pid != os.getpid():
+                self._after_fork()
+            outermost = self._lock_depth == 0
+            if outermost and fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth += 1
             try:
-                with open(self.filename, 'r') as f:
-                    data = json.load(f)
-                    log.debug(f"Read {len(data)} documents from file")
-                    return data
-            except json.JSONDecodeError as e:
-                log.error(f"JSON decode error: {e}")
-                return []
-            except Exception as e:
-                log.error(f"File read error: {e}")
-                return []
-    
-    def _write(self, data):
-        """Write all documents to file"""
-        with self._lock:
+                if outermost:
+                    self._sync()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _after_fork(self):
+        """
+        Open our own lock and log handles: flock locks belong to the open file,
+        so a handle inherited across fork would not exclude the parent.
+        """
+        self._pid = os.getpid()
+        self._lock_file = open(self.lock_filename, 'a')
+        if self._log_file is not None:
+            self._log_file = open(self.log_filename, 'a')
+        self._fsync_timer = None
+        self._unsynced_ops = 0
+
+    def _sync(self):
+        """Replay the log tail, or reload everything if another process compacted"""
+        try:
+            stat = os.stat(self.log_filename)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._log_ino:
+            self._reload()
+        elif stat.st_size > self._log_offset:
+            self._replay(maintain_indexes=True)
+
+    def _reload(self):
+        """
+        Load the snapshot and replay the whole operation log. Only reads the
+        snapshot: this may run under the shared lock, so it must not write it.
+        """
+        try:
+            with open(self.filename, 'r') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = []
+        except (json.JSONDecodeError, OSError) as e:
+            log.error("Snapshot read error for %s: %s", self.filename, e)
+            snapshot = []
+
+        self._documents = {}
+        for document in snapshot:
+            document['_id'] = str(document.get('_id') or ObjectId())
+            self._documents[document['_id']] = document
+
+        if self._log_file is not None:
+            self._log_file.close()
+        self._log_file = open(self.log_filename, 'a')
+        self._log_ino = os.fstat(self._log_file.fileno()).st_ino
+        self._log_offset = 0
+        self._log_ops = 0
+        self._replay(maintain_indexes=False)
+        self._rebuild_indexes()
+        log.debug("Loaded %s documents (%s log entries) from %s", len(self._documents), self._log_ops, self.filename)
+
+    def _replay(self, maintain_indexes):
+        """Apply the complete log lines written after ``_log_offset``"""
+        with open(self.log_filename, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # A line without its newline is an append cut short by a crash; stop before it
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines():
             try:
-                with open(self.filename, 'w') as f:
-                    json.dump(data, f, indent=2, default=str)
-                log.debug(f"Written {len(data)} documents to file")
-            except Exception as e:
-                log.error(f"File write error: {e}")
-    
-    def find_one(self, query):
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                log.warning("Skipping corrupt log entry in %s", self.log_filename)
+                continue
+            self._apply_entry(entry, maintain_indexes)
+            self._log_ops += 1
+        self._log_offset += len(complete)
+
+    def _apply_entry(self, entry, maintain_indexes):
+        if entry.get('op') == 'put':
+            document = entry['doc']
+            existing = self._documents.get(document['_id'])
+            if maintain_indexes and existing is not None:
+                self._index_remove(existing)
+            self._documents[document['_id']] = document
+            if maintain_indexes:
+                self._index_add(document)
+        elif entry.get('op') == 'del':
+            existing = self._documents.pop(entry['_id'], None)
+            if maintain_indexes and existing is not None:
+                self._index_remove(existing)
+
+    # ---------- persistence ----------
+
+    def _write_snapshot(self, documents):
+        """Atomically replace the snapshot file"""
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(documents, f, indent=2, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, self.filename)
+
+    def _append(self, entry):
+        """Append one operation to the log (the exclusive lock is held); fsync in batches"""
+        line = json.dumps(entry, default=_json_default) + '\n'
+        if os.fstat(self._log_file.fileno()).st_size > self._log_offset:
+            # Terminate a torn line left by a crashed writer so ours stays parseable
+            line = '\n' + line
+        self._log_file.write(line)
+        self._log_file.flush()
+        self._log_offset = os.fstat(self._log_file.fileno()).st_size
+        self._log_ops += 1
+        self._unsynced_ops += 1
+
+        if self._log_ops >= self.compact_threshold:
+            self.compact()
+        elif self._unsynced_ops >= self.fsync_batch:
+            self._fsync()
+        elif self._fsync_timer is None:
+            self._fsync_timer = threading.Timer(self.fsync_interval, self.flush)
+            self._fsync_timer.daemon = True
+            self._fsync_timer.start()
+
+    def _fsync(self):
+        if self._unsynced_ops:
+            started = time.perf_counter()
+            os.fsync(self._log_file.fileno())
+            self._unsynced_ops = 0
+            FALLBACK_OPERATION_SECONDS.observe(time.perf_counter() - started, *self._metric_labels, 'fsync')
+
+    def flush(self):
+        """Force pending log writes to disk"""
+        with self._lock:
+            self._fsync_timer = None
+            if self._log_file is not None:
+                self._fsync()
+
+    @_timed('compact')
+    def compact(self):
+        """
+        Fold the operation log into a fresh snapshot.
+
+        Runs under the exclusive file lock after catching up, so the snapshot
+        holds every process's writes. The log is replaced by a new file rather
+        than truncated; other processes see its new inode and reload.
+        """
+        with self._locked(exclusive=True):
+            self._write_snapshot(list(self._documents.values()))
+            tmp_filename = self.log_filename + '.tmp'
+            open(tmp_filename, 'w').close()
+            os.replace(tmp_filename, self.log_filename)
+            self._log_file.close()
+            self._log_file = open(self.log_filename, 'a')
+            self._log_ino = os.fstat(self._log_file.fileno()).st_ino
+            self._log_offset = 0
+            self._log_ops = 0
+            self._unsynced_ops = 0
+            log.debug("Compacted %s (%s documents)", self.filename, len(self._documents))
+
+    def close(self):
+        """Flush and close the operation log"""
+        with self._lock:
+            if self._fsync_timer is not None:
+                self._fsync_timer.cancel()
+                self._fsync_timer = None
+            if self._log_file is not None:
+                self._fsync()
+                self._log_file.close()
+                self._log_file = None
+
+    # ---------- indexes ----------
+
+    def _build_index(self, fields, unique=False):
+        index = {}
+        for doc_id, document in self._documents.items():
+            key = self._index_entry(fields, document)
+            if unique and key in index and key[0] is not None:
+                raise DuplicateKeyError(f"Duplicate key {key} for unique index {fields}")
+            index.setdefault(key, set()).add(doc_id)
+        self._indexes[fields] = index
+        if len(fields) == 1:
+            self._ordered[fields[0]] = sorted(
+                (_sort_key(_get_path(d, fields[0])), doc_id)
+                for doc_id, d in self._documents.items()
+                if _get_path(d, fields[0]) is not _MISSING
+            )
+
+    def _rebuild_indexes(self):
+        """Rebuild every index after the documents were reloaded from disk"""
+        for fields in list(self._indexes):
+            self._build_index(fields)
+
+    def create_index(self, keys, unique=False, **kwargs):
+        """Build a hash index on one or more fields (plus an ordered index for single fields)"""
+        fields = _normalize_index_spec(keys)
+        with self._locked(exclusive=False):
+            if fields not in self._indexes:
+                self._build_index(fields, unique)
+                log.debug("Created file-based index on %s", fields)
+            if unique:
+                self._unique.add(fields)
+            return '_'.join(fields)
+
+    @staticmethod
+    def _index_entry(fields, document):
+        values = []
+        for field in fields:
+            value = _get_path(document, field)
+            values.append(None if value is _MISSING else _index_key(value))
+        return tuple(values)
+
+    def _check_unique(self, document):
+        for fields in self._unique:
+            key = self._index_entry(fields, document)
+            if key[0] is None:
+                continue
+            if self._indexes[fields].get(key, set()) - {document['_id']}:
+                raise DuplicateKeyError(f"Duplicate key {key} for unique index {fields}")
+
+    def _index_add(self, document):
+        for fields, index in self._indexes.items():
+            index.setdefault(self._index_entry(fields, document), set()).add(document['_id'])
+        for field, entries in self._ordered.items():
+            value = _get_path(document, field)
+            if value is not _MISSING:
+                bisect.insort(entries, (_sort_key(value), document['_id']))
+
+    def _index_remove(self, document):
+        for fields, index in self._indexes.items():
+            key = self._index_entry(fields, document)
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(document['_id'])
+                if not ids:
+                    del index[key]
+        for field, entries in self._ordered.items():
+            value = _get_path(document, field)
+            if value is not _MISSING:
+                entry = (_sort_key(value), document['_id'])
+                position = bisect.bisect_left(entries, entry)
+                if position < len(entries) and entries[position] == entry:
+                    del entries[position]
+
+    def _candidate_ids(self, query):
+        """Narrow a query to candidate ids using the indexes (None means scan everything)"""
+        if '_id' in query:
+            condition = query['_id']
+            if not isinstance(condition, dict):
+                return [str(condition)]
+            if set(condition) == {'$in'}:
+                return [str(v) for v in condition['$in']]
+
+        equalities = {k: v for k, v in query.items()
+                      if not k.startswith('$') and not isinstance(v, (dict, list))}
+        best = None
+        for fields, index in self._indexes.items():
+            if all(f in equalities for f in fields) and (best is None or len(fields) > len(best)):
+                best = fields
+        if best is None:
+            return None
+        key = tuple(_index_key(_normalize_value(equalities[f])) for f in best)
+        return list(self._indexes[best].get(key, ()))
+
+    def _iter_matches(self, query):
+        ids = self._candidate_ids(query) if query else None
+        if ids is None:
+            candidates = self._documents.values()
+        else:
+            candidates = [self._documents[i] for i in ids if i in self._documents]
+        for item in candidates:
+            if not query or _matches_query(item, query):
+                yield item
+
+    # ---------- queries ----------
+
+    @_timed('find')
+    def _run_find(self, query, sort, skip, limit, projection=None):
+        """Execute a query for a cursor"""
+        with self._locked(exclusive=False):
+            ids = self._candidate_ids(query) if query else None
+            if ids is None and len(sort) == 1 and sort[0][0] in self._ordered:
+                # Walk the ordered index and stop as soon as the page is full
+                field, direction = sort[0]
+                entries = self._ordered[field]
+                ordered_ids = (doc_id for _, doc_id in (entries if direction == 1 else reversed(entries)))
+                results, skipped = [], 0
+                for doc_id in ordered_ids:
+                    item = self._documents[doc_id]
+                    if query and not _matches_query(item, query):
+                        continue
+                    if skipped < skip:
+                        skipped += 1
+                        continue
+                    results.append(item)
+                    if limit and len(results) >= limit:
+                        break
+            else:
+                results = list(self._iter_matches(query))
+                if sort:
+                    _sort_documents(results, sort)
+                results = results[skip:skip + limit] if limit else results[skip:]
+
+            if projection:
+                return [_apply_projection(item, projection) for item in results]
+            return [copy.deepcopy(item) for item in results]
+
+    def find_one(self, query=None, projection=None):
         """Find a single document matching the query"""
-        data = self._read()
-        for item in data:
-            if self._matches(item, query):
-                log.debug(f"Found document matching query: {query}")
-                return item
-        log.debug(f"No document found for query: {query}")
+        results = self._run_find(query or {}, [], 0, 1, projection)
+        if results:
+            log.debug("Found document matching query: %s", query)
+            return results[0]
+        log.debug("No document found for query: %s", query)
         return None
-    
-    def find(self, query=None):
+
+    def find(self, query=None, projection=None):
         """Find all documents matching the query"""
-        data = self._read()
-        if query is None:
-            return data
-        return [item for item in data if self._matches(item, query)]
-    
-    def _matches(self, item, query):
-        """Check if item matches query"""
-        for key, value in query.items():
-            if key == '_id':
-                if item.get('_id') != str(value):
-                    return False
-            elif item.get(key) != value:
-                return False
-        return True
-    
+        return FallbackCursor(self, query, projection)
+
+    @_timed('count')
+    def count_documents(self, query=None):
+        """Count documents matching query"""
+        with self._locked(exclusive=False):
+            if not query:
+                return len(self._documents)
+            return sum(1 for _ in self._iter_matches(query))
+
+    # ---------- writes ----------
+
+    def _put(self, document):
+        self._check_unique(document)
+        existing = self._documents.get(document['_id'])
+        if existing is not None:
+            self._index_remove(existing)
+        self._documents[document['_id']] = document
+        self._index_add(document)
+        self._append({'op': 'put', 'doc': document})
+
+    @_timed('insert')
     def insert_one(self, document):
         """Insert a single document"""
-        data = self._read()
-        doc_id = str(ObjectId())
-        document['_id'] = doc_id
-        document['created_at'] = datetime.utcnow().isoformat()
-        data.append(document)
-        self._write(data)
-        log.debug(f"Inserted document with id: {doc_id}")
-        
-        class InsertResult:
-            def __init__(self, id):
-                self.inserted_id = id
-        return InsertResult(doc_id)
-    
+        with self._locked(exclusive=True):
+            doc_id = str(document.get('_id') or ObjectId())
+            if doc_id in self._documents:
+                raise DuplicateKeyError(f"Duplicate _id: {doc_id}")
+            document['_id'] = doc_id
+            document.setdefault('created_at', datetime.utcnow().isoformat())
+            self._put(_normalize_document(document))
+        log.debug("Inserted document with id: %s", doc_id)
+        return InsertOneResult(doc_id)
+
+    def insert_many(self, documents, ordered=True):
+        """Insert several documents; duplicates raise BulkWriteError after the others are inserted"""
+        with self._locked(exclusive=True):
+            return _bulk_insert(self.insert_one, documents, ordered)
+
+    @_timed('update')
     def update_one(self, query, update, upsert=False):
         """Update a single document"""
-        data = self._read()
-        updated = False
-        
-        for i, item in enumerate(data):
-            if self._matches(item, query):
+        with self._locked(exclusive=True):
+            for item in self._iter_matches(query):
+                document = copy.deepcopy(item)
+                _apply_update(document, update)
+                self._put(document)
+                log.debug("Updated document matching query: %s", query)
+                return UpdateResult(1, 1)
+
+            if upsert:
+                # Insert new document if not found
+                new_doc = {k: v for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
                 if '$set' in update:
-                    for k, v in update['$set'].items():
-                        data[i][k] = v
-                if '$push' in update:
-                    for k, v in update['$push'].items():
-                        if k not in data[i]:
-                            data[i][k] = []
-                        data[i][k].append(v)
-                if '$pull' in update:
-                    for k, v in update['$pull'].items():
-                        if k in data[i]:
-                            data[i][k] = [x for x in data[i][k] if x.get('name') != v.get('name')]
-                data[i]['updated_at'] = datetime.utcnow().isoformat()
-                self._write(data)
-                updated = True
-                log.debug(f"Updated document matching query: {query}")
-                break
-        
-        if not updated and upsert:
-            # Insert new document if not found
-            new_doc = {**query}
-            if '$set' in update:
-                new_doc.update(update['$set'])
-            self.insert_one(new_doc)
-            updated = True
-        
-        class UpdateResult:
-            def __init__(self, modified):
-                self.modified_count = 1 if modified else 0
-                self.matched_count = 1 if modified else 0
-        
-        return UpdateResult(updated)
-    
+                    new_doc.update(update['$set'])
+                result = self.insert_one(new_doc)
+                return UpdateResult(0, 0, upserted_id=result.inserted_id)
+
+        return UpdateResult(0, 0)
+
+    @_timed('delete')
     def delete_one(self, query):
         """Delete a single document"""
-        data = self._read()
-        for i, item in enumerate(data):
-            if self._matches(item, query):
-                del data[i]
-                self._write(data)
-                log.debug(f"Deleted document matching query: {query}")
-                
-                class DeleteResult:
-                    deleted_count = 1
-                return DeleteResult()
-        
-        class DeleteResult:
-            deleted_count = 0
-        return DeleteResult()
-    
+        with self._locked(exclusive=True):
+            for item in self._iter_matches(query):
+                self._index_remove(item)
+                del self._documents[item['_id']]
+                self._append({'op': 'del', '_id': item['_id']})
+                log.debug("Deleted document matching query: %s", query)
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    @_timed('delete_many')
+    def delete_many(self, query):
+        """Delete every document matching the query"""
+        with self._locked(exclusive=True):
+            matches = list(self._iter_matches(query))
+            for item in matches:
+                self._index_remove(item)
+                del self._documents[item['_id']]
+                self._append({'op': 'del', '_id': item['_id']})
+        log.debug("Deleted %s documents matching query: %s", len(matches), query)
+        return DeleteResult(len(matches))
+
+
+# ==================== SQLITE FALLBACK (MULTI-PROCESS) ====================
+
+_FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_.]*$')
+_SQL_COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+
+def _is_sql_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+class SQLiteCollection:
+    """
+    SQLite-backed fallback collection that is safe to share between processes.
+    Provides the same PyMongo-like interface as FileBasedCollection.
+
+    Each collection is a table of (_id, JSON document) in one database file
+    opened in WAL mode, so readers never block each other or the writer and
+    every committed write is durable. Read-modify-write operations run in
+    ``BEGIN IMMEDIATE`` transactions, which serializes writers across all
+    gunicorn workers. Secondary indexes are SQLite expression indexes on
+    ``json_extract(doc, '$.field')``; equality and range filters, sort,
+    skip and limit are pushed down to SQL where possible.
+    """
+
+    def __init__(self, path, name, indexes=()):
+        if not _FIELD_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        self.path = path
+        self.name = name
+        self.filename = path
+        self._metric_labels = ('sqlite', name)
+        self._local = threading.local()
+        self._indexed_fields = {'_id'}
+        with self._transaction() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (_id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+        for spec in indexes:
+            self.create_index(spec)
+        log.info("SQLite collection initialized: %s [%s]", path, name)
+
+    # ---------- connections ----------
+
+    def _connection(self):
+        """One connection per thread (and per process, so forks don't share handles)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database write lock up front"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except sqlite3.IntegrityError as e:
+            conn.execute('ROLLBACK')
+            raise DuplicateKeyError(str(e))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    # ---------- indexes ----------
+
+    def _field_sql(self, field):
+        if field == '_id':
+            return '_id'
+        if not _FIELD_NAME_PATTERN.match(field):
+            raise ValueError(f"Invalid field name: {field}")
+        return f"json_extract(doc, '$.{field}')"
+
+    def create_index(self, keys, unique=False, **kwargs):
+        """Create an expression index on one or more document fields"""
+        spec = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        index_name = f"{self.name}_" + '_'.join(f.replace('.', '_') for f, _ in spec)
+        self._indexed_fields.update(field for field, _direction in spec)
+        columns = ', '.join(
+            self._field_sql(field) + (' DESC' if direction == -1 else '') for field, direction in spec
+        )
+        self._connection().execute(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index_name}" ON "{self.name}" ({columns})'
+        )
+        log.debug("Created SQLite index %s", index_name)
+        return index_name
+
+    # ---------- queries ----------
+
+    def _where(self, query):
+        """
+        Push equality/range/$in filters down to SQL.
+        Returns (sql, params, fully_pushed); anything not pushed is checked in Python.
+        """
+        clauses, params = [], []
+        fully_pushed = True
+        for key, condition in (query or {}).items():
+            if key.startswith('$') or (key != '_id' and not _FIELD_NAME_PATTERN.match(key)):
+                fully_pushed = False
+                continue
+            column = self._field_sql(key)
+            if _is_operator_condition(condition):
+                for op, expected in condition.items():
+                    expected = _normalize_value(expected)
+                    if key == '_id' and op != '$exists':
+                        expected = [str(v) for v in expected] if isinstance(expected, list) else str(expected)
+                    if op in _SQL_COMPARISONS and _is_sql_scalar(expected):
+                        clauses.append(f'{column} {_SQL_COMPARISONS[op]} ?')
+                        params.append(expected)
+                    elif op == '$in' and expected and all(_is_sql_scalar(v) for v in expected) and key == '_id':
+                        clauses.append(f'{column} IN ({", ".join("?" * len(expected))})')
+                        params.extend(expected)
+                    else:
+                        fully_pushed = False
+            else:
+                value = str(condition) if key == '_id' else _normalize_value(condition)
+                if not _is_sql_scalar(value):
+                    fully_pushed = False
+                elif key in self._indexed_fields:
+                    # Indexed fields hold scalars, so plain equality can use the index
+                    clauses.append(f'{column} = ?')
+                    params.append(value)
+                else:
+                    # Otherwise a scalar also matches an array field that contains it
+                    clauses.append(
+                        f"({column} = ? OR EXISTS (SELECT 1 FROM json_each(doc, '$.{key}') WHERE value = ?))"
+                    )
+                    params.extend([value, value])
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        return where, params, fully_pushed
+
+    def _select(self, conn, query, sort=(), skip=0, limit=0):
+        where, params, fully_pushed = self._where(query)
+        sql = f'SELECT doc FROM "{self.name}"{where}'
+        if sort:
+            sql += ' ORDER BY ' + ', '.join(
+                self._field_sql(field) + (' DESC' if direction == -1 else ' ASC') for field, direction in sort
+            )
+        if fully_pushed and (limit or skip):
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [limit or -1, skip]
+
+        skipped, returned = 0, 0
+        for (raw,) in conn.execute(sql, params):
+            document = json.loads(raw)
+            if query and not _matches_query(document, query):
+                continue
+            if not fully_pushed:
+                if skipped < skip:
+                    skipped += 1
+                    continue
+            yield document
+            returned += 1
+            if limit and returned >= limit:
+                return
+
+    @_timed('find')
+    def _run_find(self, query, sort, skip, limit, projection=None):
+        """Execute a query for a cursor"""
+        documents = list(self._select(self._connection(), query, sort, skip, limit))
+        if projection:
+            return [_apply_projection(d, projection) for d in documents]
+        return documents
+
+    def find_one(self, query=None, projection=None):
+        """Find a single document matching the query"""
+        results = self._run_find(query or {}, [], 0, 1, projection)
+        return results[0] if results else None
+
+    def find(self, query=None, projection=None):
+        """Find all documents matching the query"""
+        return FallbackCursor(self, query, projection)
+
+    @_timed('count')
     def count_documents(self, query=None):
         """Count documents matching query"""
-        if query is None:
-            return len(self._read())
-        return len(self.find(query))
+        conn = self._connection()
+        if not query:
+            return conn.execute(f'SELECT COUNT(*) FROM "{self.name}"').fetchone()[0]
+        return sum(1 for _ in self._select(conn, query))
+
+    # ---------- writes ----------
+
+    @_timed('insert')
+    def insert_one(self, document):
+        """Insert a single document"""
+        doc_id = str(document.get('_id') or ObjectId())
+        document['_id'] = doc_id
+        document.setdefault('created_at', datetime.utcnow().isoformat())
+        stored = _normalize_document(document)
+        with self._transaction() as conn:
+            conn.execute(
+                f'INSERT INTO "{self.name}" (_id, doc) VALUES (?, ?)',
+                (doc_id, json.dumps(stored))
+            )
+        log.debug("Inserted document with id: %s", doc_id)
+        return InsertOneResult(doc_id)
+
+    def insert_many(self, documents, ordered=True):
+        """Insert several documents; duplicates raise BulkWriteError after the others are inserted"""
+        return _bulk_insert(self.insert_one, documents, ordered)
+
+    @_timed('update')
+    def update_one(self, query, update, upsert=False):
+        """Update a single document"""
+        with self._transaction() as conn:
+            for document in self._select(conn, query, limit=1):
+                _apply_update(document, update)
+                conn.execute(
+                    f'UPDATE "{self.name}" SET doc = ? WHERE _id = ?',
+                    (json.dumps(document), document['_id'])
+                )
+                log.debug("Updated document matching query: %s", query)
+                return UpdateResult(1, 1)
 
+        if upsert:
+            new_doc = {k: v for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+            if '$set' in update:
+                new_doc.update(update['$set'])
+            result = self.insert_one(new_doc)
+            return UpdateResult(0, 0, upserted_id=result.inserted_id)
+        return UpdateResult(0, 0)
+
+    @_timed('delete')
+    def delete_one(self, query):
+        """Delete a single document"""
+        with self._transaction() as conn:
+            for document in self._select(conn, query, limit=1):
+                conn.execute(f'DELETE FROM "{self.name}" WHERE _id = ?', (document['_id'],))
+                log.debug("Deleted document matching query: %s", query)
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    @_timed('delete_many')
+    def delete_many(self, query):
+        """Delete every document matching the query"""
+        with self._transaction() as conn:
+            ids = [(document['_id'],) for document in self._select(conn, query)]
+            conn.executemany(f'DELETE FROM "{self.name}" WHERE _id = ?', ids)
+        log.debug("Deleted %s documents matching query: %s", len(ids), query)
+        return DeleteResult(len(ids))
+
+    def import_documents(self, documents):
+        """Bulk-load documents (used to migrate an existing JSON store); existing ids are kept"""
+        rows = [(str(d['_id']), json.dumps(_normalize_document(d))) for d in documents if d.get('_id')]
+        with self._transaction() as conn:
+            conn.executemany(f'INSERT OR IGNORE INTO "{self.name}" (_id, doc) VALUES (?, ?)', rows)
+        return len(rows)
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# Fallback collection instances, created once per process.
+# name -> (JSON file, indexes); the indexes mirror create_indexes() for MongoDB.
+FALLBACK_COLLECTIONS = {
+    'users': (USERS_FILE, ['email']),
+    'comparisons': (os.path.join(FALLBACK_DATA_DIR, 'comparisons.json'),
+                    ['created_at', 'user_id']),
+    'itineraries': (os.path.join(FALLBACK_DATA_DIR, 'itineraries.json'),
+                    ['created_at', [('destination', 1), ('created_at', -1)],
+                     [('fingerprint', 1), ('created_at', -1)]]),
+    'destinations': (os.path.join(FALLBACK_DATA_DIR, 'destinations.json'), []),
+    'wishlists': (os.path.join(FALLBACK_DATA_DIR, 'wishlists.json'), ['user_id']),
+}
+# name -> indexes that must also reject duplicates
+FALLBACK_UNIQUE_INDEXES = {
+    'wishlists': [[('user_id', 1), ('name', 1)]],
+}
+_fallback_collections = {}
+_fallback_lock = threading.Lock()
+
+
+def _create_fallback_collection(name, filename, indexes=()):
+    """Create a fallback collection using the configured storage engine"""
+    if Config.FALLBACK_STORAGE == 'sqlite':
+        collection = SQLiteCollection(SQLITE_FILE, name, indexes=indexes)
+        # One-time migration of an existing JSON store into SQLite
+        if collection.count_documents() == 0 and os.path.exists(filename):
+            json_store = FileBasedCollection(filename)
+            imported = collection.import_documents(json_store.find())
+            json_store.close()
+            if imported:
+                log.info("Imported %s documents from %s into SQLite [%s]", imported, filename, name)
+        return collection
 
-# Fallback collection instances
-_file_users_collection = None
+    collection = FileBasedCollection(filename, indexes=indexes)
+    atexit.register(collection.close)
+    return collection
+
+
+def get_fallback_collection(name):
+    """Get a fallback collection by name, loading it once per process"""
+    collection = _fallback_collections.get(name)
+    if collection is None:
+        with _fallback_lock:
+            collection = _fallback_collections.get(name)
+            if collection is None:
+                filename, indexes = FALLBACK_COLLECTIONS[name]
+                collection = _create_fallback_collection(name, filename, indexes)
+                for keys in FALLBACK_UNIQUE_INDEXES.get(name, []):
+                    collection.create_index(keys, unique=True)
+                _fallback_collections[name] = collection
+    return collection
 
 # ==================== CONNECTION MANAGEMENT ====================
 
@@ -265,7 +1273,7 @@ def _mask_uri(uri):
 def _create_client():
     """Create MongoDB client with optimized settings for Atlas"""
     uri = Config.MONGODB_URI
-    log.info(f"Attempting connection to: {_mask_uri(uri)}")
+    log.info("Attempting connection to: %s", _mask_uri(uri))
     
     # Connection options optimized for MongoDB Atlas
     client_options = {
@@ -282,7 +1290,11 @@ def _create_client():
         'server_api': ServerApi('1')         # Use Stable API
     }
     
-    return MongoClient(uri, **client_options)
+    return MongoClient(
+        uri,
+        event_listeners=[CommandMetricsListener(), PoolMetricsListener()],
+        **client_options
+    )
 
 
 def _test_connection(client):
@@ -296,27 +1308,55 @@ def _test_connection(client):
         
         # Try to list collections (this verifies full access)
         collections = db.list_collection_names()
-        log.debug(f"Available collections: {collections}")
+        log.debug("Available collections: %s", collections)
         
         return True
     except Exception as e:
-        log.error(f"Connection test failed: {e}")
+        log.error("Connection test failed: %s", e)
         return False
 
 
-def init_db():
+def _connect_once():
+    """
+    Make a single connection attempt.
+    
+    Returns:
+        (client, db) on success; raises on failure
+    """
+    client = _create_client()
+    if not _test_connection(client):
+        client.close()
+        raise ConnectionFailure("Connection test failed")
+    return client, client.wandrix
+
+
+def _activate_connection(client, db):
+    """Switch requests over to a freshly connected MongoDB client"""
+    global _client, _db, _is_connected, _connection_retries
+    
+    old_client = _client
+    _client = client
+    _db = db
+    _is_connected = True
+    _connection_retries = 0
+    _breaker.record_success()
+    if old_client is not None and old_client is not client:
+        old_client.close()
+
+
+def init_db(attempts=_max_retries):
     """
     Initialize MongoDB connection with retry logic and fallback support.
+    Called once at startup; afterwards the reconnection supervisor owns the
+    connection, so requests never block on a reconnect.
     
     Returns:
         Database instance or None if using file-based fallback
     """
-    global _client, _db, _file_users_collection, _connection_retries, _is_connected
+    global _connection_retries
     
     with _connection_lock:
-        log.connection("=" * 50)
-        log.connection("INITIALIZING DATABASE CONNECTION")
-        log.connection("=" * 50)
+        log.info("Initializing database connection")
         
         # Check if URI is configured
         if not Config.MONGODB_URI:
@@ -325,84 +1365,366 @@ def init_db():
             return None
         
         # Try to connect with retries
-        for attempt in range(1, _max_retries + 1):
+        for attempt in range(1, attempts + 1):
             try:
-                log.info(f"Connection attempt {attempt}/{_max_retries}...")
+                log.info("Connection attempt %s/%s...", attempt, attempts)
+                client, db = _connect_once()
+                _promote_fallback_data(db)
+                _activate_connection(client, db)
                 
-                # Create new client
-                _client = _create_client()
+                log.info("MongoDB Atlas connected (database: wandrix, pool: min=5, max=50)")
                 
-                # Test the connection
-                if _test_connection(_client):
-                    _db = _client.wandrix
-                    _is_connected = True
-                    _connection_retries = 0
-                    
-                    log.connection("=" * 50)
-                    log.success("MONGODB ATLAS CONNECTED SUCCESSFULLY!")
-                    log.info(f"Database: wandrix")
-                    log.info(f"Connection pool: min=5, max=50")
-                    
-                    # Create indexes for better performance
-                    _create_indexes()
-                    
-                    log.connection("=" * 50)
-                    return _db
-                else:
-                    raise ConnectionFailure("Connection test failed")
+                if Config.AUTO_CREATE_INDEXES:
+                    create_indexes()
+                
+                _start_supervisor()
+                return _db
                     
             except ConfigurationError as e:
-                log.error(f"Configuration error: {e}")
+                log.error("Configuration error: %s", e)
                 log.error("Please check your MONGODB_URI format")
                 break
                 
             except ServerSelectionTimeoutError as e:
-                log.warning(f"Attempt {attempt} - Server selection timeout: {e}")
-                if attempt < _max_retries:
+                log.warning("Attempt %s - Server selection timeout: %s", attempt, e)
+                if attempt < attempts:
                     wait_time = attempt * 2  # Exponential backoff
-                    log.info(f"Retrying in {wait_time} seconds...")
+                    log.info("Retrying in %s seconds...", wait_time)
                     time.sleep(wait_time)
                     
             except ConnectionFailure as e:
-                log.warning(f"Attempt {attempt} - Connection failed: {e}")
-                if attempt < _max_retries:
+                log.warning("Attempt %s - Connection failed: %s", attempt, e)
+                if attempt < attempts:
                     wait_time = attempt * 2
-                    log.info(f"Retrying in {wait_time} seconds...")
+                    log.info("Retrying in %s seconds...", wait_time)
                     time.sleep(wait_time)
                     
             except OperationFailure as e:
-                log.error(f"Operation failed (authentication?): {e}")
+                log.error("Operation failed (authentication?): %s", e)
                 break
                 
             except Exception as e:
-                log.error(f"Unexpected error: {type(e).__name__}: {e}")
-                if attempt < _max_retries:
+                log.error("Unexpected error: %s: %s", type(e).__name__, e)
+                if attempt < attempts:
                     time.sleep(2)
         
-        # All retries failed - setup fallback
+        # All retries failed - setup fallback and keep retrying in the background
         log.warning("All connection attempts failed - using file-based storage")
+        _connection_retries = attempts
+        _breaker.record_failure()
         _setup_fallback()
+        _start_supervisor()
         return None
 
 
 def _setup_fallback():
     """Setup file-based fallback storage"""
-    global _file_users_collection, _is_connected, _db
+    global _is_connected, _db
     
     _is_connected = False
     _db = None
-    _file_users_collection = FileBasedCollection(USERS_FILE)
-    log.warning("=" * 50)
-    log.warning("USING FILE-BASED FALLBACK STORAGE")
-    log.warning(f"Storage file: {USERS_FILE}")
-    log.warning("=" * 50)
+    for name in FALLBACK_COLLECTIONS:
+        get_fallback_collection(name)
+    log.warning(
+        "Using file-based fallback storage - engine: %s (%s)",
+        Config.FALLBACK_STORAGE, ', '.join(sorted(_fallback_collections))
+    )
+
+
+def connect_lazily():
+    """
+    Defer the MongoDB connection to the first time a process needs storage.
+    
+    create_app() then does no I/O. The first get_db() or health probe in each
+    process (so in each forked worker, too) starts one background connection
+    attempt; requests wait up to DB_STARTUP_WAIT_SECONDS for it before using
+    the fallback, and the supervisor takes over afterwards.
+    """
+    global _lazy_connect
+    _lazy_connect = True
+
+
+def _ensure_started():
+    """Start the background connect once per process (no-op unless connect_lazily() was called)"""
+    global _startup_pid, _client, _db, _is_connected
+    
+    if not _lazy_connect or _startup_pid == os.getpid():
+        return
+    with _startup_lock:
+        if _startup_pid == os.getpid():
+            return
+        if _startup_pid is not None:
+            # Forked after the parent connected: its client must not be used here
+            _client = None
+            _db = None
+            _is_connected = False
+        _startup_pid = os.getpid()
+        _startup_done.clear()
+        threading.Thread(target=_background_connect, name="wandrix-db-connect", daemon=True).start()
 
 
-def _create_indexes():
-    """Create database indexes for better query performance"""
+def _background_connect():
     try:
-        if _db is None:
+        # One attempt; if it fails the supervisor retries with backoff, not sleeps
+        init_db(attempts=1)
+    except Exception as e:
+        log.error("Background database initialization failed: %s", e)
+        _setup_fallback()
+    finally:
+        _startup_done.set()
+
+
+# ==================== RECONNECTION SUPERVISOR ====================
+
+class CircuitBreaker:
+    """
+    Tracks MongoDB availability for the reconnection supervisor.
+    
+    closed    - connected, requests use MongoDB
+    open      - disconnected, requests use the fallback; no attempt before next_attempt_at
+    half_open - a reconnection attempt is in progress
+    """
+    
+    def __init__(self, min_delay, max_delay):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.state = 'closed'
+        self.failures = 0
+        self.next_attempt_at = 0.0
+        self.opened_at = None
+        self._lock = threading.Lock()
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        """Open the circuit and schedule the next attempt with jittered exponential backoff"""
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is None:
+                self.opened_at = datetime.utcnow()
+            self.state = 'open'
+            delay = min(self.max_delay, self.min_delay * (2 ** (self.failures - 1)))
+            self.next_attempt_at = time.time() + random.uniform(delay / 2, delay)
+    
+    def allow_attempt(self):
+        """Move to half-open if the backoff has elapsed"""
+        with self._lock:
+            if self.state == 'open' and time.time() >= self.next_attempt_at:
+                self.state = 'half_open'
+                return True
+            return False
+    
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'open_since': self.opened_at.isoformat() if self.opened_at else None,
+            'next_attempt_in_seconds': round(max(0.0, self.next_attempt_at - time.time()), 1)
+                if self.state == 'open' else None
+        }
+
+
+_breaker = CircuitBreaker(Config.DB_RECONNECT_MIN_SECONDS, Config.DB_RECONNECT_MAX_SECONDS)
+_supervisor_thread = None
+_supervisor_pid = None
+_supervisor_stop = threading.Event()
+_supervisor_wakeup = threading.Event()
+_promotion_stats = {'promoted': 0, 'merged': 0, 'failed': 0, 'last_run': None}
+# Result of the supervisor's most recent ping, served by the health probes
+_last_ping = {'at': None, 'latency_ms': None, 'error': None}
+
+# Fields stored as ISO strings by the fallback that MongoDB should hold as dates
+_DATE_FIELDS = ('created_at', 'updated_at', 'cached_at', 'expires_at')
+
+
+def mark_disconnected(error=None):
+    """
+    Switch requests to fallback storage right away (called when a MongoDB
+    operation fails with a connection error); the supervisor reconnects.
+    """
+    if not _is_connected:
+        return
+    with _connection_lock:
+        if not _is_connected:
             return
+        log.warning("MongoDB connection lost: %s", error or "ping failed")
+        _breaker.record_failure()
+        _setup_fallback()
+    _supervisor_wakeup.set()
+
+
+def _start_supervisor():
+    """Start the reconnection supervisor thread (once per process)"""
+    global _supervisor_thread, _supervisor_pid
+    
+    if not Config.MONGODB_URI:
+        return
+    if _supervisor_thread is not None and _supervisor_pid == os.getpid() and _supervisor_thread.is_alive():
+        return
+    _supervisor_stop.clear()
+    _supervisor_pid = os.getpid()
+    _supervisor_thread = threading.Thread(target=_supervise, name="wandrix-db-supervisor", daemon=True)
+    _supervisor_thread.start()
+    log.debug("Reconnection supervisor started")
+
+
+def _supervise():
+    """Ping the live connection, or retry a lost one once the circuit allows it"""
+    while not _supervisor_stop.is_set():
+        if _is_connected:
+            interval = Config.DB_HEALTH_CHECK_INTERVAL_SECONDS
+            started = time.perf_counter()
+            try:
+                _client.admin.command('ping')
+            except Exception as e:
+                _last_ping.update(at=datetime.utcnow(), latency_ms=None, error=str(e))
+                mark_disconnected(e)
+                continue
+            _last_ping.update(at=datetime.utcnow(), latency_ms=round((time.perf_counter() - started) * 1000, 2), error=None)
+        else:
+            interval = max(0.5, _breaker.next_attempt_at - time.time())
+            if _breaker.allow_attempt():
+                _try_reconnect()
+                continue
+        
+        _supervisor_wakeup.wait(interval)
+        _supervisor_wakeup.clear()
+
+
+def _try_reconnect():
+    """One background reconnection attempt; never called from a request thread"""
+    log.info("Reconnection attempt %s...", _breaker.failures + 1)
+    try:
+        client, db = _connect_once()
+    except Exception as e:
+        _breaker.record_failure()
+        log.warning("Reconnection failed, next attempt in %ss: %s", _breaker.stats()['next_attempt_in_seconds'], e)
+        return False
+    
+    # Promote before switching so reads see the data, then again to pick up
+    # anything written to the fallback while the switch was happening
+    _promote_fallback_data(db)
+    with _connection_lock:
+        _activate_connection(client, db)
+    _promote_fallback_data(db)
+    if Config.AUTO_CREATE_INDEXES:
+        create_indexes()
+    log.info("MongoDB connection restored - left file-based fallback")
+    return True
+
+
+def _to_mongo_document(document):
+    """Restore ObjectId ids and datetime fields on a fallback document"""
+    document = dict(document)
+    if isinstance(document.get('_id'), str) and ObjectId.is_valid(document['_id']):
+        document['_id'] = ObjectId(document['_id'])
+    for field in _DATE_FIELDS:
+        if isinstance(document.get(field), str):
+            try:
+                document[field] = datetime.fromisoformat(document[field])
+            except ValueError:
+                pass
+    return document
+
+
+# Collections whose documents belong to a user through their user_id
+USER_OWNED_COLLECTIONS = ('wishlists', 'comparisons', 'itineraries')
+
+
+def _rekey_user_data(db, old_user_id, new_user_id):
+    """Move a user's documents (fallback and MongoDB) from one user id to another"""
+    for name in USER_OWNED_COLLECTIONS:
+        for collection in (get_fallback_collection(name), db[name]):
+            for entry in list(collection.find({"user_id": old_user_id}, {"_id": 1})):
+                try:
+                    collection.update_one({"_id": entry['_id']}, {"$set": {"user_id": new_user_id}})
+                except DuplicateKeyError:
+                    # Already on the surviving account's wishlist
+                    collection.delete_one({"_id": entry['_id']})
+
+
+def _promote_user(db, document):
+    """Copy a fallback user to MongoDB; if the email already exists there, move their data to that account"""
+    existing = db.users.find_one({"email": document.get("email")}, {"_id": 1})
+    if existing is None:
+        db.users.insert_one(document)
+        return 'promoted'
+    if existing['_id'] != document['_id']:
+        _rekey_user_data(db, str(document['_id']), str(existing['_id']))
+    return 'merged'
+
+
+def _promote_fallback_data(db):
+    """
+    Move documents written while MongoDB was down into MongoDB.
+    
+    Each document is copied and then removed from the fallback, so an
+    interrupted run simply resumes; ids are kept, so a retried insert is a
+    no-op. Users whose email already exists in MongoDB are merged instead,
+    so users go first: merging re-keys their wishlist, comparisons and
+    itineraries.
+    """
+    for name, collection in sorted(_fallback_collections.items(), key=lambda item: item[0] != 'users'):
+        try:
+            documents = list(collection.find())
+        except Exception as e:
+            log.error("Could not read fallback %s for promotion: %s", name, e)
+            continue
+        if not documents:
+            continue
+        
+        log.info("Promoting %s %s documents from fallback storage to MongoDB", len(documents), name)
+        for document in documents:
+            mongo_document = _to_mongo_document(document)
+            try:
+                if name == 'users':
+                    outcome = _promote_user(db, mongo_document)
+                elif name == 'destinations':
+                    # Response cache entries: newest write wins
+                    db.destinations.replace_one({"_id": mongo_document['_id']}, mongo_document, upsert=True)
+                    outcome = 'promoted'
+                else:
+                    try:
+                        db[name].insert_one(mongo_document)
+                    except DuplicateKeyError:
+                        pass
+                    outcome = 'promoted'
+                collection.delete_one({"_id": document['_id']})
+                _promotion_stats[outcome] += 1
+            except DuplicateKeyError:
+                # Unique key conflict on another field; keep it in the fallback for inspection
+                _promotion_stats['failed'] += 1
+                log.warning("Could not promote %s document %s: duplicate key", name, document['_id'])
+            except Exception as e:
+                _promotion_stats['failed'] += 1
+                log.error("Promotion of %s stopped: %s", name, e)
+                break
+    _promotion_stats['last_run'] = datetime.utcnow().isoformat()
+
+
+def stop_supervisor():
+    """Stop the reconnection supervisor"""
+    _supervisor_stop.set()
+    _supervisor_wakeup.set()
+    if _supervisor_thread is not None and _supervisor_thread.is_alive() and _supervisor_pid == os.getpid():
+        _supervisor_thread.join(timeout=5)
+
+
+def create_indexes():
+    """
+    Create database indexes for better query performance.
+    
+    Run once per deployment with ``flask create-indexes`` (or on every connect
+    with AUTO_CREATE_INDEXES). Returns whether the indexes are in place.
+    """
+    try:
+        if _db is None:
+            log.error("Cannot create indexes: not connected to MongoDB")
+            return False
             
         # Users collection indexes
         _db.users.create_index("email", unique=True)
@@ -411,51 +1733,101 @@ def _create_indexes():
         # Comparisons collection indexes
         _db.comparisons.create_index("created_at")
         log.debug("Created index on comparisons.created_at")
+        _db.comparisons.create_index([("user_id", 1), ("created_at", -1), ("_id", -1)])
+        log.debug("Created per-user history index on comparisons")
         
         # Itineraries collection indexes
         _db.itineraries.create_index([("destination", 1), ("created_at", -1)])
         log.debug("Created compound index on itineraries")
+        _db.itineraries.create_index([("fingerprint", 1), ("created_at", -1)])
+        log.debug("Created reuse index on itineraries.fingerprint")
         
-        log.success("Database indexes created successfully")
+        # Wishlists: one document per (user, destination)
+        _db.wishlists.create_index([("user_id", 1), ("name", 1)], unique=True)
+        _db.wishlists.create_index([("user_id", 1), ("added_at", 1), ("_id", 1)])
+        log.debug("Created indexes on wishlists")
+        
+        # Destinations collection doubles as the persistent response cache
+        _db.destinations.create_index("expires_at", expireAfterSeconds=0)
+        log.debug("Created TTL index on destinations.expires_at")
+        
+        log.info("Database indexes created successfully")
+        return True
         
     except Exception as e:
-        log.warning(f"Index creation warning (non-fatal): {e}")
+        log.warning("Index creation warning (non-fatal): %s", e)
+        return False
 
 
 # ==================== CONNECTION UTILITIES ====================
 
 def get_db():
     """
-    Get the database instance.
-    Attempts reconnection if the connection was lost.
+    Get the database instance without blocking.
+    While disconnected the reconnection supervisor retries in the background.
     
     Returns:
-        Database instance or None
+        Database instance or None (fallback mode)
     """
-    global _db, _is_connected
-    
+    _ensure_started()
+    if not _startup_done.is_set():
+        _startup_done.wait(Config.DB_STARTUP_WAIT_SECONDS)
     if not _is_connected or _db is None:
-        # Try to reconnect
-        log.warning("Database not connected - attempting reconnection...")
-        init_db()
+        return None
     
     return _db
 
 
-def get_connection_status():
-    """Get detailed connection status for debugging"""
+def get_connection_status(include_server_info=False):
+    """Get detailed connection status for debugging (server_info is a round trip, so only on request)"""
     return {
         'connected': _is_connected,
         'database': 'wandrix' if _db is not None else None,
         'mode': 'mongodb' if _is_connected else 'file-based',
-        'client_info': str(_client.server_info()) if _client and _is_connected else None,
-        'last_check': _last_health_check.isoformat() if _last_health_check else None
+        'client_info': str(_client.server_info()) if include_server_info and _client and _is_connected else None,
+        'last_check': _last_health_check.isoformat() if _last_health_check else None,
+        'circuit_breaker': _breaker.stats(),
+        'fallback_promotion': dict(_promotion_stats)
+    }
+
+
+def probe_status():
+    """
+    Database state for the health probes, without any I/O.
+    
+    The last ping comes from the reconnection supervisor, which already pings
+    a live connection every DB_HEALTH_CHECK_INTERVAL_SECONDS.
+    """
+    _ensure_started()
+    if _is_connected:
+        mode = 'mongodb'
+    elif not _startup_done.is_set():
+        mode = 'connecting'
+    elif _fallback_collections:
+        mode = 'fallback'
+    else:
+        mode = 'none'
+    return {
+        'mode': mode,
+        'connected': _is_connected,
+        'fallback_engine': Config.FALLBACK_STORAGE if mode == 'fallback' else None,
+        'last_ping': {
+            'at': _last_ping['at'].isoformat() if _last_ping['at'] else None,
+            'latency_ms': _last_ping['latency_ms'],
+            'error': _last_ping['error']
+        },
+        'pool': {
+            'open': int(MONGO_POOL_CONNECTIONS.get('open')),
+            'checked_out': int(MONGO_POOL_CONNECTIONS.get('checked_out'))
+        },
+        'circuit_breaker': _breaker.stats()
     }
 
 
 def health_check():
     """
-    Perform a health check on the database connection.
+    Full diagnostic health check on the database connection (pings and lists
+    collections, so only run it on explicit request).
     
     Returns:
         dict with health status information
@@ -485,20 +1857,22 @@ def health_check():
                 'database': 'wandrix',
                 'collections': _db.list_collection_names() if _db is not None else []
             }
-            log.debug(f"Health check passed - latency: {latency:.2f}ms")
+            log.debug("Health check passed - latency: %.2fms", latency)
             
         except Exception as e:
             result['status'] = 'unhealthy'
             result['mode'] = 'mongodb_atlas'
             result['details'] = {'error': str(e)}
-            log.error(f"Health check failed: {e}")
+            log.error("Health check failed: %s", e)
+            mark_disconnected(e)
             
-    elif _file_users_collection:
+    elif _fallback_collections:
         result['status'] = 'healthy'
         result['mode'] = 'file_based'
         result['details'] = {
-            'storage_file': USERS_FILE,
-            'user_count': _file_users_collection.count_documents()
+            'storage_engine': Config.FALLBACK_STORAGE,
+            'storage_files': {name: c.filename for name, c in _fallback_collections.items()},
+            'document_counts': {name: c.count_documents() for name, c in _fallback_collections.items()}
         }
     else:
         result['status'] = 'not_initialized'
@@ -517,37 +1891,45 @@ def get_users_collection():
     Returns:
         MongoDB collection or FileBasedCollection instance
     """
-    global _file_users_collection
-    
     database = get_db()
     if database is not None:
         log.debug("Returning MongoDB users collection")
         return database.users
     
-    # Ensure fallback is initialized
-    if _file_users_collection is None:
-        _file_users_collection = FileBasedCollection(USERS_FILE)
-    
     log.debug("Returning file-based users collection")
-    return _file_users_collection
+    return get_fallback_collection('users')
 
 
 def get_destinations_collection():
-    """Get the destinations collection (MongoDB only)"""
+    """Get the destinations collection, used as the persistent response cache"""
     database = get_db()
-    return database.destinations if database is not None else None
+    if database is not None:
+        return database.destinations
+    return get_fallback_collection('destinations')
 
 
 def get_comparisons_collection():
-    """Get the comparisons collection (MongoDB only)"""
+    """Get the comparisons collection (falls back to file-based storage)"""
     database = get_db()
-    return database.comparisons if database is not None else None
+    if database is not None:
+        return database.comparisons
+    return get_fallback_collection('comparisons')
 
 
 def get_itineraries_collection():
-    """Get the itineraries collection (MongoDB only)"""
+    """Get the itineraries collection (falls back to file-based storage)"""
     database = get_db()
-    return database.itineraries if database is not None else None
+    if database is not None:
+        return database.itineraries
+    return get_fallback_collection('itineraries')
+
+
+def get_wishlists_collection():
+    """Get the wishlists collection (falls back to file-based storage)"""
+    database = get_db()
+    if database is not None:
+        return database.wishlists
+    return get_fallback_collection('wishlists')
 
 
 # ==================== DECORATOR FOR AUTO-RETRY ====================
@@ -570,9 +1952,11 @@ def with_retry(max_attempts=3, delay=1):
                     return func(*args, **kwargs)
                 except (AutoReconnect, NetworkTimeout) as e:
                     last_error = e
-                    log.warning(f"Transient error in {func.__name__}, attempt {attempt}: {e}")
+                    log.warning("Transient error in %s, attempt %s: %s", func.__name__, attempt, e)
                     if attempt < max_attempts:
                         time.sleep(delay * attempt)
+                    else:
+                        mark_disconnected(e)
                 except Exception as e:
                     # Non-transient error, don't retry
                     raise
@@ -587,13 +1971,14 @@ def close_connection():
     """Gracefully close the database connection"""
     global _client, _db, _is_connected
     
+    stop_supervisor()
     if _client:
         log.info("Closing MongoDB connection...")
         _client.close()
         _client = None
         _db = None
         _is_connected = False
-        log.success("Connection closed")
+        log.info("Connection closed")
 
 
 # ==================== INITIALIZATION MESSAGE ====================
@@ -0,0 +1,134 @@
+"""
+Application logging.
+
+Every module logs through ``get_logger(name)``, a standard ``logging``
+logger under the ``wandrix`` namespace. Records are handed to a queue on the
+calling thread and formatted and written by a background listener thread,
+so request threads never wait on stdout. Messages use %-style arguments
+(``log.debug("Inserted %s", doc_id)``): a record below LOG_LEVEL is dropped
+before its message is built, and the message of a kept record is only built
+on the writer thread. High-frequency DEBUG records can be sampled with
+LOG_DEBUG_SAMPLE_RATE. Output is one JSON object per line
+(LOG_FORMAT=json) or a plain text line (LOG_FORMAT=text).
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+from config import Config
+
+ROOT_LOGGER = 'wandrix'
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_configure_lock = threading.Lock()
+_listener = None
+_queue = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single-line output for local development"""
+
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s %(name)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class DebugSampler(logging.Filter):
+    """Keep every record at INFO and above, but only a fraction of DEBUG records"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if not self.every:
+            return False
+        return next(self._counter) % self.every == 0
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def _start_listener():
+    global _listener
+    formatter = JsonFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+    _listener = logging.handlers.QueueListener(_queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def _after_fork_in_child():
+    # The listener thread does not survive a fork (e.g. gunicorn --preload)
+    if _listener is not None:
+        _start_listener()
+
+
+def configure_logging():
+    """Attach the queue handler to the ``wandrix`` logger (idempotent)"""
+    global _queue
+    with _configure_lock:
+        if _queue is not None:
+            return
+        _queue = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(_queue)
+        if Config.LOG_DEBUG_SAMPLE_RATE < 1:
+            handler.addFilter(DebugSampler(Config.LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(Config.LOG_LEVEL)
+        root.addHandler(handler)
+        root.propagate = False
+
+        _start_listener()
+        atexit.register(shutdown_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one part of the app, e.g. get_logger('auth') -> 'wandrix.auth'"""
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
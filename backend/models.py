@@ -63,3 +63,160 @@ class Itinerary(BaseModel):
     packing_suggestions: List[str]
     important_tips: List[str]
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# ==================== GEMINI RESPONSE SCHEMAS ====================
+# These mirror the JSON shapes requested in services/gemini_service.py and are
+# sent to Gemini as response schemas; they also validate the responses.
+
+class EstimatedDailyCost(BaseModel):
+    """Daily cost per travel style"""
+    budget: str
+    mid_range: str
+    luxury: str
+
+class DestinationInfo(BaseModel):
+    """Response of the destination info prompt"""
+    name: str
+    country: str
+    description: str
+    climate: str
+    best_seasons: List[str]
+    estimated_daily_cost: EstimatedDailyCost
+    top_attractions: List[str]
+    local_cuisine: List[str]
+    cultural_significance: str
+    unique_experiences: List[str]
+    accessibility: str
+    safety_rating: str
+    tourist_friendliness: str
+
+class CulturalHighlights(BaseModel):
+    history: str
+    traditions: List[str]
+    festivals: List[str]
+    art_and_architecture: str
+
+class FamousAttraction(BaseModel):
+    name: str
+    description: str
+    why_visit: str
+    best_time: str
+
+class CulinaryExperiences(BaseModel):
+    must_try_dishes: List[str]
+    food_markets: List[str]
+    dining_experiences: List[str]
+
+class ExclusiveExperience(BaseModel):
+    experience: str
+    description: str
+    best_for: str
+
+class DestinationHighlights(BaseModel):
+    """Response of the destination highlights prompt"""
+    destination: str
+    tagline: str
+    cultural_highlights: CulturalHighlights
+    famous_attractions: List[FamousAttraction]
+    culinary_experiences: CulinaryExperiences
+    exclusive_experiences: List[ExclusiveExperience]
+    hidden_gems: List[str]
+    photo_spots: List[str]
+    local_tips: List[str]
+
+class DestinationScores(BaseModel):
+    """Per-category scores (0-10, fractions allowed)"""
+    budget_match: float
+    weather_suitability: float
+    attractions_match: float
+    accessibility: float
+    unique_experiences: float
+    safety: float
+
+class DestinationAssessment(BaseModel):
+    """One destination scored against the user's preferences"""
+    name: str
+    scores: DestinationScores
+    total_score: float
+    pros: List[str]
+    cons: List[str]
+    estimated_total_cost: str
+    best_time_to_visit: str
+    highlights: List[str]
+
+class Recommendation(BaseModel):
+    winner: str
+    reasoning: str
+    key_deciding_factors: List[str]
+
+class DestinationComparison(BaseModel):
+    """Response of the comparison prompt"""
+    destination1: DestinationAssessment
+    destination2: DestinationAssessment
+    recommendation: Recommendation
+
+class ActivitySlot(BaseModel):
+    activity: str
+    location: str
+    duration: str
+    tips: str
+
+class DayMeals(BaseModel):
+    breakfast: str
+    lunch: str
+    dinner: str
+
+class ItineraryDayPlan(BaseModel):
+    """One fully planned itinerary day"""
+    day_number: int
+    title: str
+    morning: ActivitySlot
+    afternoon: ActivitySlot
+    evening: ActivitySlot
+    meals: DayMeals
+    estimated_daily_cost: str
+
+class LocalPhrase(BaseModel):
+    phrase: str
+    meaning: str
+
+class EmergencyContacts(BaseModel):
+    police: str
+    ambulance: str
+    tourist_helpline: str
+
+class GeneratedItinerary(BaseModel):
+    """Response of the single-call itinerary prompt"""
+    destination: str
+    duration_days: int
+    overview: str
+    best_time_to_visit: str
+    days: List[ItineraryDayPlan]
+    total_estimated_cost: str
+    packing_list: List[str]
+    important_tips: List[str]
+    local_phrases: List[LocalPhrase]
+    emergency_contacts: EmergencyContacts
+
+class ItineraryOutlineDay(BaseModel):
+    day_number: int
+    title: str
+    area: str
+    focus: str
+
+class ItinerarySkeleton(BaseModel):
+    """Response of the itinerary outline prompt (orchestrated mode)"""
+    destination: str
+    duration_days: int
+    overview: str
+    best_time_to_visit: str
+    day_plan: List[ItineraryOutlineDay]
+    total_estimated_cost: str
+    packing_list: List[str]
+    important_tips: List[str]
+    local_phrases: List[LocalPhrase]
+    emergency_contacts: EmergencyContacts
+
+class ItineraryDaysChunk(BaseModel):
+    """Response of a day-chunk prompt (orchestrated mode)"""
+    days: List[ItineraryDayPlan]
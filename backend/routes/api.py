@@ -1,34 +1,74 @@
-from flask import Blueprint, request, jsonify
-import asyncio
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import base64
+import itertools
+import json
+import math
 from services.gemini_service import gemini_service
+from services.event_loop import run_async, iterate_async
+from services.rate_limiter import RateLimitExceeded
+from services.cache_service import get_cache_stats, normalize_key_part
+from services.warmup import create_warmer
+from services.password_hasher import password_hasher
+from services.health_prober import health_prober
+from services.preferences import itinerary_fingerprint
+from routes.auth import get_current_user_id
+from bson import ObjectId
+from bson.errors import InvalidId
 from database import get_comparisons_collection, get_itineraries_collection, health_check as db_health_check, get_connection_status
-from datetime import datetime
+from config import Config
+from logger import get_logger
+from datetime import datetime, timedelta
 
 api_bp = Blueprint('api', __name__)
+log = get_logger('api')
 
-def run_async(coro):
-    """Helper to run async functions in sync context"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+def rate_limited_response(error):
+    """503 response telling the client when to retry a rate-limited Gemini call"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    response = jsonify({"error": str(error), "retry_after": retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def wants_full_diagnostics():
+    return request.args.get('full', '').lower() in ('1', 'true', 'yes')
 
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint with database status"""
-    db_status = db_health_check()
-    return jsonify({
-        "status": "healthy",
+    """Health summary from the cached probe state; ?full=true adds a live database diagnostic"""
+    _, snapshot = health_prober.readiness()
+    result = {
+        "status": snapshot['status'],
         "message": "Wandrix API is running",
-        "database": db_status
-    })
+        "probe": snapshot,
+        "gemini_rate_limiter": gemini_service.rate_limiter.stats(),
+        "gemini_parse": gemini_service.parse_stats,
+        "password_hasher": password_hasher.stats()
+    }
+    if wants_full_diagnostics():
+        result["database"] = db_health_check()
+    return jsonify(result)
+
+@api_bp.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({"status": "alive"})
+
+@api_bp.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 503 until storage is usable and the probe state is fresh"""
+    ready, snapshot = health_prober.readiness()
+    return jsonify({"ready": ready, **snapshot}), 200 if ready else 503
 
 @api_bp.route('/db/status', methods=['GET'])
 def database_status():
-    """Detailed database connection status"""
-    return jsonify(get_connection_status())
+    """Detailed database connection status (?full=true adds server_info)"""
+    return jsonify(get_connection_status(include_server_info=wants_full_diagnostics()))
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss statistics for the response and user caches"""
+    return jsonify({"caches": get_cache_stats(), "warmup": popular_warmer.last_run})
 
 @api_bp.route('/destination/info', methods=['POST'])
 def get_destination_info():
@@ -43,6 +83,8 @@ def get_destination_info():
     try:
         result = run_async(gemini_service.get_destination_info(destination))
         return jsonify(result)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -59,6 +101,8 @@ def get_destination_highlights():
     try:
         result = run_async(gemini_service.get_destination_highlights(destination))
         return jsonify(result)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -81,6 +125,7 @@ def compare_destinations():
         
         # Save to database
         comparison_record = {
+            "user_id": get_current_user_id(),
             "destination1": data['destination1'],
             "destination2": data['destination2'],
             "preferences": data['preferences'],
@@ -93,12 +138,129 @@ def compare_destinations():
             if comparisons is not None:
                 comparisons.insert_one(comparison_record)
         except Exception as db_error:
-            print(f"Database save error: {db_error}")
+            log.error("Database save error: %s", db_error)
         
         return jsonify(result)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/compare/batch', methods=['POST'])
+def compare_batch():
+    """
+    Rank several destinations based on user preferences.
+    
+    Each destination is scored once, so N destinations cost N Gemini calls;
+    the ranking and every pairwise result are derived from those scores.
+    """
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('destinations'), list):
+        return jsonify({"error": "destinations must be a list of destination names"}), 400
+    
+    # One entry per destination, however it is spelled or capitalised
+    unique = {}
+    for destination in data['destinations']:
+        if isinstance(destination, str) and destination.strip():
+            unique.setdefault(normalize_key_part(destination), destination.strip())
+    destinations = list(unique.values())
+    if len(destinations) < 2:
+        return jsonify({"error": "At least two distinct destinations are required"}), 400
+    if len(destinations) > Config.COMPARE_BATCH_MAX_DESTINATIONS:
+        return jsonify({
+            "error": f"At most {Config.COMPARE_BATCH_MAX_DESTINATIONS} destinations can be compared at once"
+        }), 400
+    
+    try:
+        result = run_async(gemini_service.rank_destinations(destinations, data.get('preferences', {})))
+        if not result['ranking']:
+            return jsonify({"error": "Failed to score destinations", "details": result['errors']}), 500
+        return jsonify(result)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+DEFAULT_ITINERARY_PREFERENCES = {
+    'travel_duration': 7,
+    'budget': 'medium',
+    'interests': ['general tourism'],
+    'travel_type': 'solo'
+}
+
+def save_itinerary(destination, preferences, result):
+    """Persist a generated itinerary and return its id (None if the database is unavailable)"""
+    itinerary_record = {
+        "destination": destination,
+        "preferences": preferences,
+        "itinerary": result,
+        "created_at": datetime.utcnow()
+    }
+    if 'error' not in result:
+        # Only successful itineraries can be reused
+        itinerary_record["fingerprint"] = itinerary_fingerprint(destination, preferences)
+    
+    try:
+        itineraries = get_itineraries_collection()
+        if itineraries is not None:
+            inserted = itineraries.insert_one(itinerary_record)
+            return str(inserted.inserted_id)
+    except Exception as db_error:
+        log.error("Database save error: %s", db_error)
+    return None
+
+def parse_max_age_days(value):
+    """Return max_age_days from a request as a float (None if absent); raises ValueError if it is invalid"""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        max_age_days = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("max_age_days must be a number")
+    if not math.isfinite(max_age_days) or max_age_days < 0:
+        raise ValueError("max_age_days must be a finite number of days, 0 or more")
+    return max_age_days
+
+def find_reusable_itinerary(destination, preferences, max_age_days=None):
+    """Find the newest saved itinerary for the same destination and canonical preferences"""
+    if max_age_days is None:
+        max_age_days = Config.ITINERARY_REUSE_MAX_AGE_DAYS
+    if max_age_days <= 0:
+        return None
+    
+    try:
+        itineraries = get_itineraries_collection()
+        if itineraries is None:
+            return None
+        matches = list(itineraries.find({
+            "fingerprint": itinerary_fingerprint(destination, preferences),
+            "created_at": {"$gte": datetime.utcnow() - timedelta(days=max_age_days)}
+        }).sort("created_at", -1).limit(1))
+    except Exception as db_error:
+        log.warning("Itinerary reuse lookup error: %s", db_error)
+        return None
+    
+    if not matches:
+        return None
+    result = matches[0]['itinerary']
+    result['itinerary_id'] = str(matches[0]['_id'])
+    result['reused'] = True
+    return result
+
+def replay_itinerary_events(itinerary):
+    """Emit a saved itinerary in the same event format as a live stream"""
+    itinerary = dict(itinerary)
+    itinerary_id = itinerary.pop('itinerary_id', None)
+    itinerary.pop('reused', None)
+    for day in itinerary.pop('days', []) or []:
+        yield json.dumps({"type": "day", "day": day}) + "\n"
+    for key, value in itinerary.items():
+        yield json.dumps({"type": "field", "key": key, "value": value}) + "\n"
+    yield json.dumps({"type": "complete", "itinerary_id": itinerary_id, "reused": True}) + "\n"
+
 @api_bp.route('/itinerary/generate', methods=['POST'])
 def generate_itinerary():
     """Generate a personalized travel itinerary"""
@@ -107,38 +269,100 @@ def generate_itinerary():
     if not data or 'destination' not in data:
         return jsonify({"error": "Destination is required"}), 400
     
-    preferences = data.get('preferences', {
-        'travel_duration': 7,
-        'budget': 'medium',
-        'interests': ['general tourism'],
-        'travel_type': 'solo'
-    })
+    preferences = data.get('preferences', DEFAULT_ITINERARY_PREFERENCES)
+    force_regenerate = bool(data.get('force_regenerate'))
+    try:
+        max_age_days = parse_max_age_days(data.get('max_age_days'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
+        if not force_regenerate:
+            reused = find_reusable_itinerary(data['destination'], preferences, max_age_days)
+            if reused is not None:
+                return jsonify(reused)
+        
         result = run_async(gemini_service.generate_itinerary(
             data['destination'],
-            preferences
+            preferences,
+            refresh=force_regenerate,
+            mode=data.get('mode')
         ))
         
         # Save to database
-        itinerary_record = {
-            "destination": data['destination'],
-            "preferences": preferences,
-            "itinerary": result,
-            "created_at": datetime.utcnow()
-        }
-        
-        try:
-            itineraries = get_itineraries_collection()
-            if itineraries is not None:
-                inserted = itineraries.insert_one(itinerary_record)
-                result['itinerary_id'] = str(inserted.inserted_id)
-        except Exception as db_error:
-            print(f"Database save error: {db_error}")
+        itinerary_id = save_itinerary(data['destination'], preferences, result)
+        if itinerary_id:
+            result['itinerary_id'] = itinerary_id
         
         return jsonify(result)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/itinerary/generate/stream', methods=['POST'])
+def stream_itinerary():
+    """
+    Stream a personalized itinerary as newline-delimited JSON.
+    
+    Each line is one event: {"type": "day", "day": {...}} for every completed day,
+    {"type": "field", "key": ..., "value": ...} for the other top-level fields,
+    then {"type": "complete", "itinerary_id": ...} once the document is saved.
+    """
+    data = request.get_json()
+    
+    if not data or 'destination' not in data:
+        return jsonify({"error": "Destination is required"}), 400
+    
+    destination = data['destination']
+    preferences = data.get('preferences', DEFAULT_ITINERARY_PREFERENCES)
+    try:
+        max_age_days = parse_max_age_days(data.get('max_age_days'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if not data.get('force_regenerate'):
+        reused = find_reusable_itinerary(destination, preferences, max_age_days)
+        if reused is not None:
+            return Response(
+                replay_itinerary_events(reused),
+                mimetype='application/x-ndjson',
+                headers={'Cache-Control': 'no-cache'}
+            )
+    
+    events = iterate_async(gemini_service.stream_itinerary(destination, preferences))
+    
+    # Pull the first event eagerly so quota errors can still become a 503
+    try:
+        first_event = next(events)
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except StopIteration:
+        return jsonify({"error": "Empty response from Gemini"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        try:
+            for kind, key, value in itertools.chain([first_event], events):
+                if kind == 'item':
+                    yield json.dumps({"type": "day", "day": value}) + "\n"
+                elif kind == 'field':
+                    yield json.dumps({"type": "field", "key": key, "value": value}) + "\n"
+                elif kind == 'complete':
+                    itinerary_id = save_itinerary(destination, preferences, value)
+                    yield json.dumps({"type": "complete", "itinerary_id": itinerary_id}) + "\n"
+        except Exception as e:
+            log.error("Itinerary stream error: %s", e)
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        finally:
+            events.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @api_bp.route('/itinerary/<itinerary_id>', methods=['GET'])
 def get_itinerary(itinerary_id):
@@ -160,20 +384,95 @@ def get_itinerary(itinerary_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Fields returned by the history list; the full result is served by /comparisons/<id>
+HISTORY_LIST_FIELDS = ["destination1", "destination2", "preferences", "result.recommendation.winner", "created_at"]
+HISTORY_FIELDS = {"destination1", "destination2", "preferences", "result", "created_at"}
+
+def encode_history_cursor(document):
+    """Opaque keyset cursor pointing just after this document"""
+    created_at = document['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    return base64.urlsafe_b64encode(f"{created_at}|{document['_id']}".encode()).decode()
+
+def decode_history_cursor(cursor):
+    """Return (created_at, _id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, _, doc_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 @api_bp.route('/comparisons/history', methods=['GET'])
 def get_comparison_history():
-    """Get recent comparison history"""
+    """
+    Get comparison history, newest first.
+    
+    Signed-in users see their own comparisons, anonymous callers see anonymous ones.
+    Query params: limit, cursor (next_cursor of the previous page) and fields
+    (comma-separated, e.g. "fields=result" for the full documents).
+    """
+    try:
+        limit = min(max(1, int(request.args.get('limit', Config.HISTORY_PAGE_SIZE))), Config.HISTORY_MAX_PAGE_SIZE)
+        query = {"user_id": get_current_user_id()}
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, doc_id = decode_history_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": doc_id}}
+            ]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    fields = request.args.get('fields')
+    if fields:
+        projection = [f.strip() for f in fields.split(',') if f.strip() in HISTORY_FIELDS]
+        projection = sorted(set(projection) | {"created_at"})
+    else:
+        projection = HISTORY_LIST_FIELDS
+    
     try:
         comparisons = get_comparisons_collection()
         if comparisons is None:
             return jsonify({"error": "Database not available"}), 500
         
-        history = list(comparisons.find().sort("created_at", -1).limit(10))
+        # One extra row tells whether another page exists
+        history = list(comparisons.find(query, projection).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1))
+        has_more = len(history) > limit
+        history = history[:limit]
         
         for item in history:
             item['_id'] = str(item['_id'])
         
-        return jsonify({"history": history})
+        return jsonify({
+            "history": history,
+            "next_cursor": encode_history_cursor(history[-1]) if has_more else None,
+            "has_more": has_more
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/comparisons/<comparison_id>', methods=['GET'])
+def get_comparison(comparison_id):
+    """Get a saved comparison with its full result"""
+    try:
+        comparisons = get_comparisons_collection()
+        if comparisons is None:
+            return jsonify({"error": "Database not available"}), 500
+        
+        try:
+            comparison = comparisons.find_one({"_id": ObjectId(comparison_id)})
+        except InvalidId:
+            comparison = None
+        
+        # Comparisons made while signed in are private to their owner
+        if not comparison or comparison.get('user_id') not in (None, get_current_user_id()):
+            return jsonify({"error": "Comparison not found"}), 404
+        
+        comparison['_id'] = str(comparison['_id'])
+        comparison.pop('user_id', None)
+        return jsonify(comparison)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -193,6 +492,9 @@ POPULAR_DESTINATIONS = [
     {"name": "Santorini", "country": "Greece", "image": "santorini.jpg", "tagline": "Jewel of the Aegean"}
 ]
 
+# Keeps info, highlights and common itineraries for the popular list pre-generated
+popular_warmer = create_warmer(gemini_service, POPULAR_DESTINATIONS)
+
 @api_bp.route('/destinations/popular', methods=['GET'])
 def get_popular_destinations():
     """Get list of popular destinations"""
@@ -1,56 +1,68 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from database import get_users_collection, get_db
 from config import Config
-from datetime import datetime, timedelta
+from logger import get_logger
+from services.cache_service import TTLCache, register_cache
+from services import wishlist_service
+from services.password_hasher import password_hasher, HasherBusy
+from services.token_verifier import token_verifier
+from datetime import datetime
 from bson import ObjectId
 from bson.errors import InvalidId
-import jwt
+import copy
+import math
 import os
-import traceback
 
 auth_bp = Blueprint('auth', __name__)
+log = get_logger('auth')
 
-# Secret key for JWT - use from config
-JWT_SECRET = Config.JWT_SECRET
 JWT_EXPIRATION_HOURS = Config.JWT_EXPIRATION_HOURS
 
+# Authenticated users keyed on user id, so repeat requests skip the database
+user_cache = register_cache('users', TTLCache(
+    max_entries=Config.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=Config.USER_CACHE_TTL_SECONDS
+))
+
 def generate_token(user_id):
     """Generate JWT token for user"""
-    payload = {
-        'user_id': str(user_id),
-        'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS),
-        'iat': datetime.utcnow()
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+    return token_verifier.issue(user_id, JWT_EXPIRATION_HOURS)
 
 def verify_token(token):
     """Verify JWT token and return user_id"""
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        return payload['user_id']
-    except jwt.ExpiredSignatureError:
-        print("[AUTH] Token expired")
-        return None
-    except jwt.InvalidTokenError as e:
-        print(f"[AUTH] Invalid token: {e}")
-        return None
+    return token_verifier.verify(token)
 
-def get_current_user():
-    """Get current user from Authorization header"""
+def get_current_user_id():
+    """Get the user id from the Authorization header without loading the user"""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
     
     token = auth_header.split(' ')[1]
-    user_id = verify_token(token)
+    return verify_token(token)
+
+def get_current_user():
+    """Get current user from Authorization header"""
+    user_id = get_current_user_id()
     
     if not user_id:
         return None
     
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    
+    user = _load_user(user_id)
+    if user:
+        user_cache.set(user_id, user)
+        return copy.deepcopy(user)
+    return None
+
+def _load_user(user_id):
+    """Load a user from the database (without the password hash)"""
     users = get_users_collection()
     if users is None:
-        print("[AUTH] Users collection not available")
+        log.error("Users collection not available")
         return None
     
     try:
@@ -63,11 +75,23 @@ def get_current_user():
         
         if user:
             user['_id'] = str(user['_id'])
+            user.pop('password', None)
+            if 'wishlist' in user:
+                # Wishlist still embedded by an older version: move it to its own collection
+                wishlist_service.migrate_user_wishlist(user['_id'], user.pop('wishlist') or [])
         return user
     except Exception as e:
-        print(f"[AUTH] Error getting user: {e}")
+        log.error("Error getting user: %s", e)
         return None
 
+def hasher_busy_response(error):
+    """503 response telling the client when to retry while the hashing queue is full"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    response = jsonify({"error": str(error), "retry_after": retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -96,7 +120,7 @@ def register():
         
         users = get_users_collection()
         if users is None:
-            print("[AUTH] Database not available for registration")
+            log.error("Database not available for registration")
             return jsonify({"error": "Database not available. Please try again later."}), 500
         
         # Check if user already exists
@@ -107,9 +131,8 @@ def register():
         # Create new user document
         user_doc = {
             "email": email,
-            "password": generate_password_hash(password),
+            "password": password_hasher.hash(password),
             "name": name,
-            "wishlist": [],
             "created_at": datetime.utcnow()
         }
         
@@ -117,7 +140,7 @@ def register():
         user_id = result.inserted_id
         token = generate_token(user_id)
         
-        print(f"[AUTH] User registered successfully: {email}")
+        log.info("User registered successfully: %s", email)
         
         return jsonify({
             "message": "Registration successful",
@@ -129,11 +152,20 @@ def register():
             }
         }), 201
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
-        print(f"[AUTH] Registration error: {e}")
-        traceback.print_exc()
+        log.exception("Registration error: %s", e)
         return jsonify({"error": "Registration failed. Please try again."}), 500
 
+def _rehash_password(users, user, password):
+    """Upgrade a stored hash to the configured method; login succeeds even if this fails"""
+    try:
+        users.update_one({"_id": user['_id']}, {"$set": {"password": password_hasher.rehash(password)}})
+        log.info("Upgraded password hash for: %s", user['email'])
+    except Exception as e:
+        log.warning("Password rehash failed for %s: %s", user['email'], e)
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Login user"""
@@ -148,22 +180,25 @@ def login():
         
         users = get_users_collection()
         if users is None:
-            print("[AUTH] Database not available for login")
+            log.error("Database not available for login")
             return jsonify({"error": "Database not available. Please try again later."}), 500
         
         user = users.find_one({"email": email})
         
         if not user:
-            print(f"[AUTH] Login failed - user not found: {email}")
+            log.info("Login failed - user not found: %s", email)
             return jsonify({"error": "Invalid email or password"}), 401
         
-        if not check_password_hash(user['password'], password):
-            print(f"[AUTH] Login failed - invalid password for: {email}")
+        if not password_hasher.verify(user['password'], password):
+            log.info("Login failed - invalid password for: %s", email)
             return jsonify({"error": "Invalid email or password"}), 401
         
+        if password_hasher.needs_rehash(user['password']):
+            _rehash_password(users, user, password)
+        
         token = generate_token(user['_id'])
         
-        print(f"[AUTH] User logged in successfully: {email}")
+        log.info("User logged in successfully: %s", email)
         
         return jsonify({
             "message": "Login successful",
@@ -175,9 +210,10 @@ def login():
             }
         })
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
-        print(f"[AUTH] Login error: {e}")
-        traceback.print_exc()
+        log.exception("Login error: %s", e)
         return jsonify({"error": "Login failed. Please try again."}), 500
     
     return jsonify({
@@ -203,20 +239,28 @@ def get_me():
             "id": user['_id'],
             "email": user['email'],
             "name": user['name'],
-            "wishlist": user.get('wishlist', [])
+            "wishlist": wishlist_service.list_wishlist(user['_id'])[0]
         }
     })
 
 @auth_bp.route('/wishlist', methods=['GET'])
 def get_wishlist():
-    """Get user's wishlist"""
+    """Get user's wishlist, a page at a time (limit, cursor)"""
     user = get_current_user()
     
     if not user:
         return jsonify({"error": "Unauthorized"}), 401
     
+    try:
+        limit = min(max(1, int(request.args.get('limit', Config.WISHLIST_PAGE_SIZE))), Config.WISHLIST_MAX_PAGE_SIZE)
+        wishlist, next_cursor = wishlist_service.list_wishlist(user['_id'], limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     return jsonify({
-        "wishlist": user.get('wishlist', [])
+        "wishlist": wishlist,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
     })
 
 @auth_bp.route('/wishlist/add', methods=['POST'])
@@ -238,35 +282,14 @@ def add_to_wishlist():
     if not isinstance(destination, dict) or 'name' not in destination:
         return jsonify({"error": "Invalid destination format"}), 400
     
-    users = get_users_collection()
-    if users is None:
-        return jsonify({"error": "Database not available"}), 500
-    
-    # Check if already in wishlist
-    current_wishlist = user.get('wishlist', [])
-    for item in current_wishlist:
-        if item.get('name') == destination['name']:
-            return jsonify({"error": "Destination already in wishlist"}), 409
-    
-    # Add timestamp
-    destination['added_at'] = datetime.utcnow().isoformat()
-    
     try:
-        # Try with ObjectId for MongoDB, fall back to string for file-based
-        try:
-            users.update_one(
-                {"_id": ObjectId(user['_id'])},
-                {"$push": {"wishlist": destination}}
-            )
-        except:
-            users.update_one(
-                {"_id": user['_id']},
-                {"$push": {"wishlist": destination}}
-            )
+        added = wishlist_service.add_to_wishlist(user['_id'], destination)
+        if added is None:
+            return jsonify({"error": "Destination already in wishlist"}), 409
         
         return jsonify({
             "message": "Added to wishlist",
-            "destination": destination
+            "destination": added
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -286,22 +309,8 @@ def remove_from_wishlist():
     
     destination_name = data['name']
     
-    users = get_users_collection()
-    if users is None:
-        return jsonify({"error": "Database not available"}), 500
-    
     try:
-        # Try with ObjectId for MongoDB, fall back to string for file-based
-        try:
-            users.update_one(
-                {"_id": ObjectId(user['_id'])},
-                {"$pull": {"wishlist": {"name": destination_name}}}
-            )
-        except:
-            users.update_one(
-                {"_id": user['_id']},
-                {"$pull": {"wishlist": {"name": destination_name}}}
-            )
+        wishlist_service.remove_from_wishlist(user['_id'], destination_name)
         
         return jsonify({
             "message": "Removed from wishlist",
@@ -318,9 +327,74 @@ def check_in_wishlist(destination_name):
     if not user:
         return jsonify({"in_wishlist": False})
     
-    current_wishlist = user.get('wishlist', [])
-    for item in current_wishlist:
-        if item.get('name') == destination_name:
-            return jsonify({"in_wishlist": True})
+    return jsonify({"in_wishlist": wishlist_service.is_in_wishlist(user['_id'], destination_name)})
+
+def _batch_names(data):
+    """Validate the "names" list of a batch wishlist request; returns (names, error response)"""
+    names = (data or {}).get('names')
+    if not isinstance(names, list) or not all(isinstance(n, str) and n for n in names):
+        return None, (jsonify({"error": "names must be a list of destination names"}), 400)
+    if len(names) > Config.WISHLIST_BATCH_MAX:
+        return None, (jsonify({"error": f"At most {Config.WISHLIST_BATCH_MAX} destinations per request"}), 400)
+    return list(dict.fromkeys(names)), None
+
+@auth_bp.route('/wishlist/check/batch', methods=['POST'])
+def check_in_wishlist_batch():
+    """Check several destinations at once; returns a name -> bool map"""
+    names, error = _batch_names(request.get_json())
+    if error:
+        return error
+    
+    user = get_current_user()
+    if not user:
+        return jsonify({"in_wishlist": {name: False for name in names}})
+    
+    try:
+        return jsonify({"in_wishlist": wishlist_service.check_many(user['_id'], names)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@auth_bp.route('/wishlist/add/batch', methods=['POST'])
+def add_to_wishlist_batch():
+    """Add several destinations in one request"""
+    user = get_current_user()
+    
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    destinations = (request.get_json() or {}).get('destinations')
+    if not isinstance(destinations, list) or not all(isinstance(d, dict) and d.get('name') for d in destinations):
+        return jsonify({"error": "destinations must be a list of destinations with a name"}), 400
+    if len(destinations) > Config.WISHLIST_BATCH_MAX:
+        return jsonify({"error": f"At most {Config.WISHLIST_BATCH_MAX} destinations per request"}), 400
     
-    return jsonify({"in_wishlist": False})
+    try:
+        added, existing = wishlist_service.add_many(user['_id'], destinations)
+        return jsonify({
+            "message": f"Added {len(added)} destinations to wishlist",
+            "added": added,
+            "already_in_wishlist": existing
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@auth_bp.route('/wishlist/remove/batch', methods=['POST'])
+def remove_from_wishlist_batch():
+    """Remove several destinations in one request"""
+    user = get_current_user()
+    
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    names, error = _batch_names(request.get_json())
+    if error:
+        return error
+    
+    try:
+        removed = wishlist_service.remove_many(user['_id'], names)
+        return jsonify({
+            "message": f"Removed {removed} destinations from wishlist",
+            "removed": removed
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
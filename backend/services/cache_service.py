@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from logger import get_logger
+
+log = get_logger('cache')
+
+# Registry of named caches so stats can be reported from a single place
+_caches: Dict[str, "TTLCache"] = {}
+
+
+def register_cache(name: str, cache):
+    """Register a cache under a name for stats reporting"""
+    _caches[name] = cache
+    return cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get hit/miss statistics for every registered cache"""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def normalize_key_part(value: str) -> str:
+    """Normalize a free-form value (e.g. a destination name) for use in a cache key"""
+    return " ".join(str(value).lower().split())
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default=None):
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl_seconds: Optional[float] = None):
+        """Store a value, evicting the least recently used entries when full"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def ttl_remaining(self, key: str) -> float:
+        """Seconds until the entry expires (0 if missing)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return 0.0
+            return max(0.0, entry[1] - time.monotonic())
+
+    def delete(self, key: str):
+        """Remove a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for this cache"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    Tier 1 is a bounded in-memory TTLCache. Tier 2 is an optional persistent
+    collection (PyMongo-like) looked up on a memory miss; entries found there
+    are promoted back into memory for the rest of their lifetime.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        collection_getter: Optional[Callable[[], Any]] = None
+    ):
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.collection_getter = collection_getter
+        self._lock = threading.Lock()
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self.persistent_errors = 0
+
+    def _collection(self):
+        if self.collection_getter is None:
+            return None
+        try:
+            return self.collection_getter()
+        except Exception as e:
+            log.warning("Persistent tier unavailable: %s", e)
+            return None
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str):
+        """Look up a key in memory, then in the persistent tier"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        return self._get_persistent(key)
+
+    async def aget(self, key: str):
+        """Async lookup; only the persistent tier is moved off the event loop"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.collection_getter is None:
+            return None
+        return await asyncio.to_thread(self._get_persistent, key)
+
+    def _get_persistent(self, key: str):
+        collection = self._collection()
+        if collection is None:
+            return None
+
+        try:
+            doc = collection.find_one({"_id": key})
+        except Exception as e:
+            self._count('persistent_errors')
+            log.warning("Persistent lookup failed for %s: %s", key, e)
+            return None
+
+        if not doc or 'data' not in doc:
+            self._count('persistent_misses')
+            return None
+
+        remaining = self._seconds_until(doc.get('expires_at'))
+        if remaining <= 0:
+            self._count('persistent_misses')
+            return None
+
+        self._count('persistent_hits')
+        self.memory.set(key, doc['data'], ttl_seconds=remaining)
+        return doc['data']
+
+    def set(self, key: str, value, metadata: Optional[Dict[str, Any]] = None):
+        """Store a value in memory and, when available, in the persistent tier"""
+        self.memory.set(key, value)
+        self._set_persistent(key, value, metadata)
+
+    async def aset(self, key: str, value, metadata: Optional[Dict[str, Any]] = None):
+        """Async store; the persistent write runs in a worker thread"""
+        self.memory.set(key, value)
+        if self.collection_getter is not None:
+            await asyncio.to_thread(self._set_persistent, key, value, metadata)
+
+    def _set_persistent(self, key: str, value, metadata: Optional[Dict[str, Any]] = None):
+        collection = self._collection()
+        if collection is None:
+            return
+
+        now = datetime.utcnow()
+        record = {
+            **(metadata or {}),
+            "data": value,
+            "cached_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds)
+        }
+        try:
+            collection.update_one({"_id": key}, {"$set": record}, upsert=True)
+        except Exception as e:
+            self._count('persistent_errors')
+            log.warning("Persistent write failed for %s: %s", key, e)
+
+    def ttl_remaining(self, key: str) -> float:
+        """Seconds until the in-memory copy of the entry expires"""
+        return self.memory.ttl_remaining(key)
+
+    async def attl_remaining(self, key: str) -> float:
+        """Seconds until the entry expires, loading it from the persistent tier on a memory miss"""
+        remaining = self.memory.ttl_remaining(key)
+        if remaining <= 0 and self.collection_getter is not None:
+            await asyncio.to_thread(self._get_persistent, key)
+            remaining = self.memory.ttl_remaining(key)
+        return remaining
+
+    @staticmethod
+    def _seconds_until(expires_at) -> float:
+        if expires_at is None:
+            return 0.0
+        if isinstance(expires_at, str):
+            try:
+                expires_at = datetime.fromisoformat(expires_at)
+            except ValueError:
+                return 0.0
+        if expires_at.tzinfo is not None:
+            expires_at = expires_at.replace(tzinfo=None)
+        return (expires_at - datetime.utcnow()).total_seconds()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for both tiers"""
+        return {
+            **self.memory.stats(),
+            'persistent_hits': self.persistent_hits,
+            'persistent_misses': self.persistent_misses,
+            'persistent_errors': self.persistent_errors
+        }
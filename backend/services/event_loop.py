@@ -0,0 +1,82 @@
+"""
+Shared asyncio event loop for the Flask (WSGI) request threads.
+
+A single long-lived loop runs in a daemon thread per process. Request
+threads submit coroutines to it and wait for the result, so all in-flight
+Gemini calls are multiplexed on one loop instead of each request building
+and tearing down its own. The waiting thread stays blocked for the whole
+call, so concurrent calls per worker are still capped by its thread count.
+"""
+
+import asyncio
+import os
+import threading
+
+_loop = None
+_loop_thread = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_event_loop():
+    """Get the shared event loop, starting it on first use (and again after a fork)"""
+    global _loop, _loop_thread, _loop_pid
+
+    if _loop is not None and _loop_pid == os.getpid() and _loop.is_running():
+        return _loop
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or not _loop_thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _loop_thread = threading.Thread(
+                target=_run_loop,
+                args=(_loop,),
+                name="wandrix-event-loop",
+                daemon=True
+            )
+            _loop_thread.start()
+    return _loop
+
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared loop and block the calling thread until it finishes"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def iterate_async(async_gen, timeout=None):
+    """Drive an async generator on the shared loop from a synchronous generator"""
+    loop = get_event_loop()
+
+    async def _next():
+        return await async_gen.__anext__()
+
+    try:
+        while True:
+            future = asyncio.run_coroutine_threadsafe(_next(), loop)
+            try:
+                yield future.result(timeout)
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(async_gen.aclose(), loop).result(5)
+
+
+def shutdown_event_loop():
+    """Stop the shared loop (used on application shutdown)"""
+    global _loop
+    with _loop_lock:
+        if _loop is not None and _loop_pid == os.getpid():
+            _loop.call_soon_threadsafe(_loop.stop)
+            _loop_thread.join(timeout=5)
+        _loop = None
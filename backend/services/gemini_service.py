@@ -1,19 +1,194 @@
 from google import genai
 from google.genai import types
 from google.genai.errors import ClientError
-import json
+import asyncio
+import copy
 import re
+import threading
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from config import Config
-from typing import Dict, Any
+from logger import get_logger
+from database import get_destinations_collection
+from services.metrics import counter, histogram
+from services.cache_service import ResponseCache, register_cache, normalize_key_part
+from services.preferences import canonicalize_itinerary_preferences, canonicalize_preferences, ordered_pair
+from services.rate_limiter import GeminiRateLimiter, RateLimitExceeded, backoff_delay, retry_after_hint
+from services.single_flight import SingleFlight, canonical_request_key
+from services.stream_parser import IncrementalJSONParser
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError, create_model
+from models import (
+    DestinationAssessment,
+    DestinationComparison,
+    DestinationHighlights,
+    DestinationInfo,
+    GeneratedItinerary,
+    ItineraryDaysChunk,
+    ItinerarySkeleton
+)
+
+log = get_logger('gemini')
+
+GEMINI_REQUEST_SECONDS = histogram(
+    'wandrix_gemini_request_seconds',
+    'Duration of individual Gemini calls, excluding time queued in the rate limiter',
+    ('operation', 'outcome')
+)
+GEMINI_RETRIES = counter('wandrix_gemini_retries_total', 'Gemini calls retried after a rate-limit response', ('operation',))
+GEMINI_RATE_LIMITED = counter('wandrix_gemini_rate_limited_total', 'Gemini calls rejected with 429 / RESOURCE_EXHAUSTED', ('operation',))
+GEMINI_TOKENS = counter('wandrix_gemini_tokens_total', 'Tokens reported by Gemini usage metadata', ('operation', 'kind'))
+GEMINI_PARSE_RESULTS = counter(
+    'wandrix_gemini_parse_results_total',
+    'Structured responses that validated, needed a field repair, or could not be parsed',
+    ('operation', 'result')
+)
+
+
+def _record_usage(operation: str, usage) -> None:
+    """Add a response's token counts to the token counter"""
+    if usage is None:
+        return
+    for kind, attribute in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count'), ('thinking', 'thoughts_token_count')):
+        count = getattr(usage, attribute, None)
+        if count:
+            GEMINI_TOKENS.inc(operation, kind, amount=count)
+
+
+# Gemini requests made in the current context (and the tasks it starts), see count_calls()
+_call_counter: ContextVar[Optional[List[int]]] = ContextVar('gemini_call_counter', default=None)
+
+
+def _count_call() -> None:
+    counter = _call_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+# Bump these whenever the corresponding prompt changes so stale cache entries are ignored
+DESTINATION_INFO_PROMPT_VERSION = 1
+DESTINATION_HIGHLIGHTS_PROMPT_VERSION = 1
+COMPARISON_PROMPT_VERSION = 1
+ITINERARY_PROMPT_VERSION = 1
+SCORE_PROMPT_VERSION = 1
+
+# Score categories shared by pairwise comparisons and batch rankings
+SCORE_CATEGORIES = (
+    'budget_match',
+    'weather_suitability',
+    'attractions_match',
+    'accessibility',
+    'unique_experiences',
+    'safety'
+)
+
+# JSON shape of one itinerary day, shared by the single-call and per-chunk prompts
+ITINERARY_DAY_FORMAT = """{
+                    "day_number": 1,
+                    "title": "Day theme/title",
+                    "morning": {
+                        "activity": "activity description",
+                        "location": "specific location/attraction",
+                        "duration": "estimated time",
+                        "tips": "helpful tip"
+                    },
+                    "afternoon": {
+                        "activity": "activity description",
+                        "location": "specific location/attraction",
+                        "duration": "estimated time",
+                        "tips": "helpful tip"
+                    },
+                    "evening": {
+                        "activity": "activity description",
+                        "location": "specific location/attraction",
+                        "duration": "estimated time",
+                        "tips": "helpful tip"
+                    },
+                    "meals": {
+                        "breakfast": "restaurant/food recommendation",
+                        "lunch": "restaurant/food recommendation",
+                        "dinner": "restaurant/food recommendation"
+                    },
+                    "estimated_daily_cost": "cost in USD"
+                }"""
+
+def _as_number(value):
+    """Coerce a model-provided score to a number (0 when missing or malformed)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
 
 class GeminiService:
     """Service for interacting with Google Gemini API"""
     
     def __init__(self):
-        self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        # Built on first use, so importing this module does no client setup
+        self._client = None
+        self._client_lock = threading.Lock()
         # Use gemini-2.5-flash which is the latest model
         self.model_name = "gemini-2.5-flash"
+        # Destination content barely changes, so it is cached in memory and in the destinations collection
+        self.destination_cache = register_cache('destination_content', ResponseCache(
+            max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.RESPONSE_CACHE_TTL_SECONDS,
+            collection_getter=get_destinations_collection
+        ))
+        # Comparisons are keyed on the unordered destination pair and canonical preferences
+        self.comparison_cache = register_cache('comparisons', ResponseCache(
+            max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.COMPARISON_CACHE_TTL_SECONDS,
+            collection_getter=get_destinations_collection
+        ))
+        # Itineraries are keyed on the destination and canonical itinerary preferences
+        self.itinerary_cache = register_cache('itineraries', ResponseCache(
+            max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.RESPONSE_CACHE_TTL_SECONDS,
+            collection_getter=get_destinations_collection
+        ))
+        self.rate_limiter = GeminiRateLimiter(
+            requests_per_minute=Config.GEMINI_REQUESTS_PER_MINUTE,
+            burst=Config.GEMINI_BURST,
+            max_concurrency=Config.GEMINI_MAX_CONCURRENCY,
+            max_queue=Config.GEMINI_MAX_QUEUE,
+            max_wait=Config.GEMINI_MAX_QUEUE_WAIT_SECONDS,
+            state_file=Config.GEMINI_RATE_LIMIT_STATE_FILE or None
+        )
+        # Identical concurrent requests share one upstream call
+        self.in_flight = register_cache('gemini_single_flight', SingleFlight())
+        # How often responses validated directly, needed a field repair, or were lost
+        self.parse_stats = {'valid': 0, 'repaired': 0, 'failed': 0}
+    
+    def _destination_cache_key(self, kind: str, destination: str, prompt_version: int) -> str:
+        """Build the cache key for a destination-level response"""
+        return f"{kind}:v{prompt_version}:{normalize_key_part(destination)}"
+    
+    async def _cache_destination_response(self, kind: str, destination: str, key: str, result: Dict[Any, Any]):
+        """Cache a destination response unless it is an error"""
+        if not result or 'error' in result:
+            return
+        await self.destination_cache.aset(key, result, metadata={
+            "kind": kind,
+            "name": normalize_key_part(destination)
+        })
+    
+    def _itinerary_cache_key(self, destination: str, preferences: Dict[str, Any]) -> str:
+        """Cache key for an itinerary; preferences must already be canonical"""
+        return f"itinerary:v{ITINERARY_PROMPT_VERSION}:" + canonical_request_key('itinerary', [destination], preferences)
+    
+    async def cache_ttl_remaining(self, kind: str, destination: str, preferences: Optional[Dict[str, Any]] = None) -> float:
+        """Seconds until cached 'info', 'highlights' or 'itinerary' content expires (0 if not cached)"""
+        if kind == 'info':
+            return await self.destination_cache.attl_remaining(
+                self._destination_cache_key('info', destination, DESTINATION_INFO_PROMPT_VERSION))
+        if kind == 'highlights':
+            return await self.destination_cache.attl_remaining(
+                self._destination_cache_key('highlights', destination, DESTINATION_HIGHLIGHTS_PROMPT_VERSION))
+        if kind == 'itinerary':
+            return await self.itinerary_cache.attl_remaining(
+                self._itinerary_cache_key(destination, canonicalize_itinerary_preferences(preferences)))
+        raise ValueError(f"Unknown content kind: {kind}")
     
     def _clean_json_response(self, response_text: str) -> str:
         """Clean and extract JSON from response"""
@@ -22,46 +197,161 @@ class GeminiService:
         response_text = re.sub(r'```\s*', '', response_text)
         return response_text.strip()
     
-    def _parse_json_response(self, response_text: str) -> Dict[Any, Any]:
-        """Parse JSON from response text"""
-        cleaned = self._clean_json_response(response_text)
+    @property
+    def client(self) -> genai.Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
+    
+    def _record_parse(self, operation: str, result: str):
+        self.parse_stats[result] += 1
+        GEMINI_PARSE_RESULTS.inc(operation, result)
+    
+    def _response_config(self, schema: Optional[Type[BaseModel]]) -> Optional[types.GenerateContentConfig]:
+        """Ask Gemini for schema-constrained JSON instead of free text"""
+        if schema is None or not Config.GEMINI_STRUCTURED_OUTPUT:
+            return None
+        return types.GenerateContentConfig(
+            response_mime_type='application/json',
+            response_schema=schema
+        )
+    
+    async def _generate_json(self, prompt: str, schema: Type[BaseModel], operation: str) -> Dict[Any, Any]:
+        """
+        Generate a response and validate it against a models.py schema.
+        
+        Structured output normally validates on the first try. When it does not
+        (truncated or partially invalid JSON), the valid top-level fields are
+        kept and only the broken ones are requested again.
+        """
+        response_text = await self._generate(prompt, schema=schema, operation=operation)
+        try:
+            result = schema.model_validate_json(response_text).model_dump()
+            self._record_parse(operation, 'valid')
+            return result
+        except ValidationError:
+            pass
+        
+        # Salvage every complete, valid top-level field
+        parser = IncrementalJSONParser(stream_key=None)
+        try:
+            parser.feed(response_text)
+        except ValueError:
+            pass
+        document = parser.document
+        if not document:
+            self._record_parse(operation, 'failed')
+            log.warning("%s: nothing could be salvaged from the response", schema.__name__)
+            return {"error": "Failed to parse response", "raw": response_text}
+        
         try:
-            return json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            print(f"Raw response: {cleaned[:500]}")
-            return {"error": "Failed to parse response", "raw": cleaned}
-    
-    def _generate(self, prompt: str, retries: int = 3) -> str:
-        """Generate content using Gemini API with retry logic"""
-        last_error = None
+            result = schema.model_validate(document).model_dump()
+            self._record_parse(operation, 'valid')
+            return result
+        except ValidationError as e:
+            # Model-level errors have no field to re-request
+            broken = sorted({
+                str(err['loc'][0]) for err in e.errors()
+                if err['loc'] and err['loc'][0] in schema.model_fields
+            })
+        if not broken:
+            self._record_parse(operation, 'failed')
+            log.warning("%s: invalid response has no field to re-request", schema.__name__)
+            return {"error": "Failed to parse response", "raw": response_text}
+        
+        log.info("%s: re-requesting fields %s", schema.__name__, broken)
+        repair_schema = create_model(
+            f"{schema.__name__}Repair",
+            **{name: (schema.model_fields[name].annotation, ...) for name in broken}
+        )
+        repair_prompt = (
+            f"{prompt}\n        The rest of the response is already done. "
+            f"Return a JSON object with ONLY these fields: {', '.join(broken)}."
+        )
+        try:
+            patch = repair_schema.model_validate_json(
+                self._clean_json_response(await self._generate(repair_prompt, schema=repair_schema, operation=operation))
+            )
+            result = schema.model_validate({**document, **patch.model_dump()}).model_dump()
+            self._record_parse(operation, 'repaired')
+            return result
+        except ValidationError as e:
+            self._record_parse(operation, 'failed')
+            log.warning("%s still invalid after repair: %s errors", schema.__name__, e.error_count())
+            return {"error": "Failed to parse response", "raw": response_text}
+    
+    def _is_rate_limit_error(self, error: ClientError) -> bool:
+        """Check if a Gemini error is a quota/rate-limit rejection"""
+        error_str = str(error)
+        return getattr(error, 'code', None) == 429 or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+    
+    async def _generate(
+        self,
+        prompt: str,
+        retries: int = 3,
+        schema: Optional[Type[BaseModel]] = None,
+        operation: str = 'generate'
+    ) -> str:
+        """Generate content through the shared rate limiter with retry logic"""
         for attempt in range(retries):
-            try:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
-                return response.text
-            except ClientError as e:
-                last_error = e
-                error_str = str(e)
-                print(f"Gemini API error (attempt {attempt + 1}/{retries}): {error_str}")
-                
-                # Check if it's a rate limit error
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    wait_time = 30 * (attempt + 1)  # Exponential backoff
-                    print(f"Rate limited. Waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
+            if attempt:
+                GEMINI_RETRIES.inc(operation)
+            async with self.rate_limiter.slot():
+                started = time.perf_counter()
+                _count_call()
+                try:
+                    response = await self.client.aio.models.generate_content(
+                        model=self.model_name,
+                        contents=prompt,
+                        config=self._response_config(schema)
+                    )
+                    GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, 'ok')
+                    _record_usage(operation, response.usage_metadata)
+                    return response.text
+                except ClientError as e:
+                    log.warning("Gemini API error (attempt %s/%s): %s", attempt + 1, retries, e)
+                    if not self._is_rate_limit_error(e):
+                        GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, 'error')
+                        raise e
+                    GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, 'rate_limited')
+                    GEMINI_RATE_LIMITED.inc(operation)
+                    wait_time = backoff_delay(
+                        attempt,
+                        base=2.0,
+                        cap=Config.GEMINI_MAX_BACKOFF_SECONDS,
+                        hint=retry_after_hint(e)
+                    )
+                except Exception as e:
+                    GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, 'error')
+                    log.error("Unexpected error: %s", e)
                     raise e
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                raise e
+            
+            # Pause every caller, not just this one, then retry through the queue
+            self.rate_limiter.penalize(wait_time)
+            if attempt == retries - 1 or wait_time > Config.GEMINI_MAX_BACKOFF_SECONDS:
+                raise RateLimitExceeded("Gemini quota exhausted, please retry later", retry_after=wait_time)
+            log.warning("Rate limited. Pausing Gemini calls for %.1f seconds...", wait_time)
         
-        raise last_error if last_error else Exception("Failed after retries")
+        raise RateLimitExceeded("Gemini quota exhausted, please retry later", retry_after=0)
     
-    async def get_destination_info(self, destination: str) -> Dict[Any, Any]:
-        """Get detailed information about a tourist destination"""
+    async def get_destination_info(self, destination: str, refresh: bool = False) -> Dict[Any, Any]:
+        """Get detailed information about a tourist destination (refresh=True bypasses the cache)"""
+        cache_key = self._destination_cache_key('info', destination, DESTINATION_INFO_PROMPT_VERSION)
+        cached = None if refresh else await self.destination_cache.aget(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        flight_key = canonical_request_key('destination_info', [destination])
+        return await self.in_flight.do(flight_key, lambda: self._fetch_destination_info(destination, cache_key))
+    
+    async def _fetch_destination_info(self, destination: str, cache_key: str) -> Dict[Any, Any]:
+        """Call Gemini for destination info and cache the result"""
         prompt = f"""
         Provide detailed tourist information about {destination} in JSON format.
         Include the following fields:
@@ -88,10 +378,13 @@ class GeminiService:
         """
         
         try:
-            response_text = self._generate(prompt)
-            return self._parse_json_response(response_text)
+            result = await self._generate_json(prompt, DestinationInfo, 'destination_info')
+            await self._cache_destination_response('info', destination, cache_key, result)
+            return result
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log.error("Gemini API error: %s", e)
             return {"error": str(e)}
     
     async def compare_destinations(
@@ -101,6 +394,42 @@ class GeminiService:
         preferences: Dict[str, Any]
     ) -> Dict[Any, Any]:
         """Compare two destinations based on user preferences"""
+        preferences = canonicalize_preferences(preferences)
+        first, second, swapped = ordered_pair(dest1, dest2)
+        cache_key = self._comparison_cache_key(first, second, preferences)
+        
+        result = await self.comparison_cache.aget(cache_key)
+        if result is None:
+            result = await self.in_flight.do(
+                cache_key,
+                lambda: self._fetch_comparison(first, second, preferences, cache_key)
+            )
+        return self._orient_comparison(result, dest1, dest2, swapped)
+    
+    def _comparison_cache_key(self, first: str, second: str, preferences: Dict[str, Any]) -> str:
+        """Cache key for a canonically ordered destination pair"""
+        return f"compare:v{COMPARISON_PROMPT_VERSION}:" + canonical_request_key('compare', [first, second], preferences)
+    
+    def _orient_comparison(self, result: Dict[Any, Any], dest1: str, dest2: str, swapped: bool) -> Dict[Any, Any]:
+        """Return a copy of a canonically ordered comparison in the caller's destination order"""
+        if not result or 'error' in result:
+            return result
+        result = copy.deepcopy(result)
+        if swapped:
+            result['destination1'], result['destination2'] = result.get('destination2'), result.get('destination1')
+        for field, name in (('destination1', dest1), ('destination2', dest2)):
+            if isinstance(result.get(field), dict):
+                result[field]['name'] = name
+        return result
+    
+    async def _fetch_comparison(
+        self,
+        dest1: str,
+        dest2: str,
+        preferences: Dict[str, Any],
+        cache_key: str
+    ) -> Dict[Any, Any]:
+        """Call Gemini to compare two destinations and cache the result"""
         prompt = f"""
         You are an expert travel advisor. Compare these two tourist destinations based on the user's preferences.
         
@@ -108,12 +437,12 @@ class GeminiService:
         Destination 2: {dest2}
         
         User Preferences:
-        - Budget: {preferences.get('budget', 'medium')}
-        - Travel Duration: {preferences.get('travel_duration', 7)} days
-        - Interests: {', '.join(preferences.get('interests', ['general tourism']))}
-        - Preferred Season: {preferences.get('season', 'any')}
-        - Travel Type: {preferences.get('travel_type', 'solo')}
-        - Accessibility Needs: {preferences.get('accessibility_needs', 'none')}
+        - Budget: {preferences['budget']}
+        - Travel Duration: {preferences['travel_duration']} days
+        - Interests: {', '.join(preferences['interests'])}
+        - Preferred Season: {preferences['season']}
+        - Travel Type: {preferences['travel_type']}
+        - Accessibility Needs: {preferences['accessibility_needs']}
         
         Provide a comprehensive comparison in the following JSON format:
         {{
@@ -163,18 +492,145 @@ class GeminiService:
         """
         
         try:
-            response_text = self._generate(prompt)
-            return self._parse_json_response(response_text)
+            result = await self._generate_json(prompt, DestinationComparison, 'compare_destinations')
+            if 'error' not in result:
+                await self.comparison_cache.aset(cache_key, result, metadata={
+                    "kind": "compare",
+                    "destinations": [normalize_key_part(dest1), normalize_key_part(dest2)]
+                })
+            return result
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log.error("Gemini API error: %s", e)
             return {"error": str(e)}
     
-    async def generate_itinerary(
-        self, 
-        destination: str, 
-        preferences: Dict[str, Any]
-    ) -> Dict[Any, Any]:
-        """Generate a personalized day-wise travel itinerary"""
+    async def score_destination(self, destination: str, preferences: Dict[str, Any]) -> Dict[Any, Any]:
+        """Score one destination against canonical preferences (the building block of rankings)"""
+        cache_key = f"score:v{SCORE_PROMPT_VERSION}:" + canonical_request_key('score', [destination], preferences)
+        cached = await self.comparison_cache.aget(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        return await self.in_flight.do(cache_key, lambda: self._fetch_score(destination, preferences, cache_key))
+    
+    async def _fetch_score(self, destination: str, preferences: Dict[str, Any], cache_key: str) -> Dict[Any, Any]:
+        """Call Gemini to score a single destination and cache the result"""
+        prompt = f"""
+        You are an expert travel advisor. Score this tourist destination against the user's preferences.
+        Use an absolute scale so scores are comparable with other destinations scored the same way.
+        
+        Destination: {destination}
+        
+        User Preferences:
+        - Budget: {preferences['budget']}
+        - Travel Duration: {preferences['travel_duration']} days
+        - Interests: {', '.join(preferences['interests'])}
+        - Preferred Season: {preferences['season']}
+        - Travel Type: {preferences['travel_type']}
+        - Accessibility Needs: {preferences['accessibility_needs']}
+        
+        Return the assessment in the following JSON format:
+        {{
+            "name": "{destination}",
+            "scores": {{
+                "budget_match": 0-10,
+                "weather_suitability": 0-10,
+                "attractions_match": 0-10,
+                "accessibility": 0-10,
+                "unique_experiences": 0-10,
+                "safety": 0-10
+            }},
+            "total_score": 0-60,
+            "pros": ["list of 3-4 advantages"],
+            "cons": ["list of 2-3 disadvantages"],
+            "estimated_total_cost": "estimated total trip cost in USD",
+            "best_time_to_visit": "best time based on preferences",
+            "highlights": ["3 must-do activities"]
+        }}
+        
+        Return ONLY valid JSON, no additional text.
+        """
+        
+        try:
+            result = await self._generate_json(prompt, DestinationAssessment, 'score_destination')
+            if 'error' not in result:
+                await self.comparison_cache.aset(cache_key, result, metadata={
+                    "kind": "score",
+                    "name": normalize_key_part(destination)
+                })
+            return result
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            log.error("Gemini API error: %s", e)
+            return {"error": str(e)}
+    
+    async def rank_destinations(self, destinations: List[str], preferences: Dict[str, Any]) -> Dict[Any, Any]:
+        """
+        Rank N destinations with one scoring call each (run concurrently),
+        deriving every pairwise comparison from the per-destination scores.
+        """
+        preferences = canonicalize_preferences(preferences)
+        unique = {}
+        for destination in destinations:
+            unique.setdefault(normalize_key_part(destination), destination.strip())
+        unique = list(unique.values())
+        # A rate-limited score cancels the others instead of letting them spend quota on a lost ranking
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(self.score_destination(d, preferences)) for d in unique]
+        except ExceptionGroup as e:
+            # Surface the first failure itself so RateLimitExceeded still maps to a 503
+            raise e.exceptions[0]
+        results = [task.result() for task in tasks]
+        
+        scored, errors = [], []
+        for name, result in zip(unique, results):
+            if not result or 'error' in result:
+                errors.append({"name": name, "error": (result or {}).get('error', 'No response')})
+                continue
+            entry = copy.deepcopy(result)
+            entry['name'] = name
+            entry['scores'] = {c: _as_number(entry.get('scores', {}).get(c)) for c in SCORE_CATEGORIES}
+            entry['total_score'] = sum(entry['scores'].values())
+            scored.append(entry)
+        
+        scored.sort(key=lambda e: e['total_score'], reverse=True)
+        for rank, entry in enumerate(scored, start=1):
+            entry['rank'] = rank
+        
+        pairwise = []
+        matrix = {e['name']: {} for e in scored}
+        for i, first in enumerate(scored):
+            for second in scored[i + 1:]:
+                margin = first['total_score'] - second['total_score']
+                factors = sorted(
+                    (c for c in SCORE_CATEGORIES if first['scores'][c] != second['scores'][c]),
+                    key=lambda c: abs(first['scores'][c] - second['scores'][c]),
+                    reverse=True
+                )[:3]
+                pairwise.append({
+                    "destination1": first['name'],
+                    "destination2": second['name'],
+                    # Ranking is by total score, so destination1 never loses; equal totals are a tie
+                    "winner": first['name'] if margin > 0 else None,
+                    "margin": margin,
+                    "key_deciding_factors": factors
+                })
+                matrix[first['name']][second['name']] = margin
+                matrix[second['name']][first['name']] = -margin
+        
+        return {
+            "preferences": preferences,
+            "ranking": scored,
+            "pairwise": pairwise,
+            "matrix": matrix,
+            "recommendation": {"winner": scored[0]['name']} if scored else None,
+            "errors": errors
+        }
+    
+    def _itinerary_prompt(self, destination: str, preferences: Dict[str, Any]) -> str:
+        """Build the itinerary prompt shared by the blocking and streaming variants"""
         duration = preferences.get('travel_duration', 7)
         budget = preferences.get('budget', 'medium')
         interests = preferences.get('interests', ['general tourism'])
@@ -196,34 +652,7 @@ class GeminiService:
             "overview": "Brief trip overview (2-3 sentences)",
             "best_time_to_visit": "recommended time to visit",
             "days": [
-                {{
-                    "day_number": 1,
-                    "title": "Day theme/title",
-                    "morning": {{
-                        "activity": "activity description",
-                        "location": "specific location/attraction",
-                        "duration": "estimated time",
-                        "tips": "helpful tip"
-                    }},
-                    "afternoon": {{
-                        "activity": "activity description",
-                        "location": "specific location/attraction",
-                        "duration": "estimated time",
-                        "tips": "helpful tip"
-                    }},
-                    "evening": {{
-                        "activity": "activity description",
-                        "location": "specific location/attraction",
-                        "duration": "estimated time",
-                        "tips": "helpful tip"
-                    }},
-                    "meals": {{
-                        "breakfast": "restaurant/food recommendation",
-                        "lunch": "restaurant/food recommendation",
-                        "dinner": "restaurant/food recommendation"
-                    }},
-                    "estimated_daily_cost": "cost in USD"
-                }}
+                {ITINERARY_DAY_FORMAT}
             ],
             "total_estimated_cost": "total trip cost in USD",
             "packing_list": ["list of 8-10 essential items to pack"],
@@ -243,16 +672,298 @@ class GeminiService:
         Include specific place names, restaurants, and activities.
         Return ONLY valid JSON, no additional text.
         """
+        return prompt
+    
+    async def generate_itinerary(
+        self, 
+        destination: str, 
+        preferences: Dict[str, Any],
+        refresh: bool = False,
+        mode: Optional[str] = None
+    ) -> Dict[Any, Any]:
+        """
+        Generate a personalized day-wise travel itinerary.
+        
+        refresh=True bypasses the cache. mode is 'single', 'orchestrated' or
+        'auto' (orchestrate trips of ITINERARY_ORCHESTRATE_MIN_DAYS or more).
+        """
+        preferences = canonicalize_itinerary_preferences(preferences)
+        cache_key = self._itinerary_cache_key(destination, preferences)
+        cached = None if refresh else await self.itinerary_cache.aget(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
         
+        result = await self.in_flight.do(cache_key, lambda: self._fetch_itinerary(destination, preferences, cache_key, mode))
+        return copy.deepcopy(result)
+    
+    def _use_orchestration(self, duration: int, mode: Optional[str]) -> bool:
+        """Decide between one itinerary prompt and the skeleton + day-chunk pipeline"""
+        mode = (mode or Config.ITINERARY_ORCHESTRATION).lower()
+        if mode == 'orchestrated':
+            return True
+        if mode == 'single':
+            return False
+        return duration >= Config.ITINERARY_ORCHESTRATE_MIN_DAYS
+    
+    def minimum_calls(self, kind: str, preferences: Optional[Dict[str, Any]] = None) -> int:
+        """Gemini calls a cache refresh of kind costs at least (retries and repairs come on top)"""
+        if kind != 'itinerary':
+            return 1
+        duration = canonicalize_itinerary_preferences(preferences)['travel_duration']
+        if not self._use_orchestration(duration, None):
+            return 1
+        # Skeleton plus one call per chunk of days
+        return 1 + -(-duration // max(1, Config.ITINERARY_CHUNK_DAYS))
+    
+    @staticmethod
+    @contextmanager
+    def count_calls():
+        """Count the Gemini requests made inside the block, including by the tasks it starts"""
+        counter = [0]
+        token = _call_counter.set(counter)
+        try:
+            yield counter
+        finally:
+            _call_counter.reset(token)
+    
+    async def _fetch_itinerary(
+        self,
+        destination: str,
+        preferences: Dict[str, Any],
+        cache_key: str,
+        mode: Optional[str] = None
+    ) -> Dict[Any, Any]:
+        """Call Gemini for an itinerary and cache the result"""
         try:
-            response_text = self._generate(prompt)
-            return self._parse_json_response(response_text)
+            if self._use_orchestration(preferences['travel_duration'], mode):
+                result = await self._generate_orchestrated_itinerary(destination, preferences)
+            else:
+                result = await self._generate_json(self._itinerary_prompt(destination, preferences), GeneratedItinerary, 'generate_itinerary')
+            if 'error' not in result:
+                await self.itinerary_cache.aset(cache_key, result, metadata={
+                    "kind": "itinerary",
+                    "name": normalize_key_part(destination)
+                })
+            return result
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log.error("Gemini API error: %s", e)
             return {"error": str(e)}
     
-    async def get_destination_highlights(self, destination: str) -> Dict[Any, Any]:
-        """Get special highlights and unique features of a destination"""
+    async def _generate_orchestrated_itinerary(self, destination: str, preferences: Dict[str, Any]) -> Dict[Any, Any]:
+        """
+        Build a long itinerary from one short skeleton call plus concurrent
+        calls for chunks of days, merged back into the single-call schema.
+        """
+        duration = preferences['travel_duration']
+        skeleton = await self._generate_json(self._itinerary_skeleton_prompt(destination, preferences), ItinerarySkeleton, 'itinerary_skeleton')
+        if 'error' in skeleton:
+            return skeleton
+        
+        plan = {d.get('day_number'): d for d in skeleton.pop('day_plan', []) if isinstance(d, dict)}
+        day_plan = [plan.get(n) or {"day_number": n} for n in range(1, duration + 1)]
+        chunk_size = max(1, Config.ITINERARY_CHUNK_DAYS)
+        chunks = [day_plan[i:i + chunk_size] for i in range(0, duration, chunk_size)]
+        semaphore = asyncio.Semaphore(Config.ITINERARY_CHUNK_CONCURRENCY)
+        
+        async def generate_chunk(chunk):
+            async with semaphore:
+                prompt = self._itinerary_chunk_prompt(destination, preferences, skeleton, day_plan, chunk)
+                for attempt in range(2):
+                    result = await self._generate_json(prompt, ItineraryDaysChunk, 'itinerary_days')
+                    days = result.get('days') if isinstance(result.get('days'), list) else None
+                    if days and len(days) == len(chunk):
+                        return days
+                    log.warning(
+                        "Itinerary chunk for days %s-%s was invalid (attempt %s/2)",
+                        chunk[0]['day_number'], chunk[-1]['day_number'], attempt + 1
+                    )
+                raise ValueError(f"Could not generate days {chunk[0]['day_number']}-{chunk[-1]['day_number']}")
+        
+        # A failed chunk cancels the others instead of letting them spend quota on a lost itinerary
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(generate_chunk(chunk)) for chunk in chunks]
+        except ExceptionGroup as e:
+            # Surface the first failure itself so RateLimitExceeded still maps to a 503
+            raise e.exceptions[0]
+        chunk_days = [task.result() for task in tasks]
+        
+        days = []
+        for chunk, generated in zip(chunks, chunk_days):
+            for planned, day in zip(chunk, generated):
+                # Trust the skeleton's numbering, not the model's
+                day['day_number'] = planned['day_number']
+                days.append(day)
+        
+        return {
+            "destination": skeleton.get('destination', destination),
+            "duration_days": duration,
+            "overview": skeleton.get('overview', ''),
+            "best_time_to_visit": skeleton.get('best_time_to_visit', ''),
+            "days": days,
+            **{k: v for k, v in skeleton.items()
+               if k not in ('destination', 'duration_days', 'overview', 'best_time_to_visit')}
+        }
+    
+    def _itinerary_skeleton_prompt(self, destination: str, preferences: Dict[str, Any]) -> str:
+        """Prompt for the trip outline: per-day themes and areas plus the trip-level fields"""
+        duration = preferences['travel_duration']
+        return f"""
+        Outline a {duration}-day travel itinerary for {destination}. Do not plan individual activities yet.
+        
+        User Preferences:
+        - Budget Level: {preferences['budget']}
+        - Interests: {', '.join(preferences['interests'])}
+        - Travel Type: {preferences['travel_type']}
+        - Duration: {duration} days
+        
+        Return the outline in the following JSON format, with exactly {duration} entries in "day_plan":
+        {{
+            "destination": "{destination}",
+            "duration_days": {duration},
+            "overview": "Brief trip overview (2-3 sentences)",
+            "best_time_to_visit": "recommended time to visit",
+            "day_plan": [
+                {{"day_number": 1, "title": "Day theme/title", "area": "neighbourhood or region covered", "focus": "main interest for the day"}}
+            ],
+            "total_estimated_cost": "total trip cost in USD",
+            "packing_list": ["list of 8-10 essential items to pack"],
+            "important_tips": ["list of 5-6 important travel tips"],
+            "local_phrases": [
+                {{"phrase": "local greeting", "meaning": "English meaning"}},
+                {{"phrase": "thank you in local language", "meaning": "Thank you"}}
+            ],
+            "emergency_contacts": {{
+                "police": "emergency number",
+                "ambulance": "emergency number",
+                "tourist_helpline": "tourist helpline if available"
+            }}
+        }}
+        
+        Spread the days sensibly across areas so nothing is visited twice.
+        Return ONLY valid JSON, no additional text.
+        """
+    
+    def _itinerary_chunk_prompt(
+        self,
+        destination: str,
+        preferences: Dict[str, Any],
+        skeleton: Dict[str, Any],
+        day_plan: List[Dict[str, Any]],
+        chunk: List[Dict[str, Any]]
+    ) -> str:
+        """Prompt for the full detail of a few consecutive days of an outlined trip"""
+        outline = "\n".join(
+            f"        Day {d['day_number']}: {d.get('title', '')} ({d.get('area', '')})" for d in day_plan
+        )
+        requested = ", ".join(str(d['day_number']) for d in chunk)
+        return f"""
+        You are planning a {preferences['travel_duration']}-day trip to {destination}.
+        {skeleton.get('overview', '')}
+        
+        User Preferences:
+        - Budget Level: {preferences['budget']}
+        - Interests: {', '.join(preferences['interests'])}
+        - Travel Type: {preferences['travel_type']}
+        
+        Full trip outline (other days are planned separately; do not repeat their places):
+{outline}
+        
+        Write the detailed plan for days {requested} only, following the outline for those days.
+        Return it in the following JSON format, with exactly {len(chunk)} entries in "days":
+        {{
+            "days": [
+                {ITINERARY_DAY_FORMAT}
+            ]
+        }}
+        
+        Include specific place names, restaurants, and activities.
+        Return ONLY valid JSON, no additional text.
+        """
+    
+    async def stream_itinerary(
+        self,
+        destination: str,
+        preferences: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, str, Any]]:
+        """
+        Stream an itinerary as it is generated.
+        
+        Yields ('item', 'days', day) for each completed day, ('field', key, value)
+        for every other top-level field, and finally ('complete', None, itinerary).
+        """
+        preferences = canonicalize_itinerary_preferences(preferences)
+        prompt = self._itinerary_prompt(destination, preferences)
+        parser = IncrementalJSONParser(stream_key='days')
+        
+        async with self.rate_limiter.slot():
+            started = time.perf_counter()
+            usage = None
+            _count_call()
+            try:
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=self._response_config(GeneratedItinerary)
+                )
+                async for chunk in stream:
+                    # Usage is cumulative; the last chunk carries the totals
+                    usage = chunk.usage_metadata or usage
+                    if not chunk.text:
+                        continue
+                    for event in parser.feed(chunk.text):
+                        yield event
+                GEMINI_REQUEST_SECONDS.observe(time.perf_counter() - started, 'stream_itinerary', 'ok')
+                _record_usage('stream_itinerary', usage)
+            except ClientError as e:
+                log.error("Gemini streaming error: %s", e)
+                rate_limited = self._is_rate_limit_error(e)
+                GEMINI_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, 'stream_itinerary', 'rate_limited' if rate_limited else 'error'
+                )
+                if rate_limited:
+                    GEMINI_RATE_LIMITED.inc('stream_itinerary')
+                    wait_time = backoff_delay(
+                        0,
+                        base=2.0,
+                        cap=Config.GEMINI_MAX_BACKOFF_SECONDS,
+                        hint=retry_after_hint(e)
+                    )
+                    self.rate_limiter.penalize(wait_time)
+                    raise RateLimitExceeded("Gemini quota exhausted, please retry later", retry_after=wait_time)
+                raise e
+        
+        if not parser.finished:
+            raise ValueError("Itinerary stream ended before the JSON document was complete")
+        # The cache is shared with generate_itinerary, so only a valid itinerary may go in
+        try:
+            itinerary = GeneratedItinerary.model_validate(parser.document).model_dump()
+        except ValidationError as e:
+            self._record_parse('stream_itinerary', 'failed')
+            log.warning("Streamed itinerary is invalid: %s errors", e.error_count())
+            raise ValueError("Streamed itinerary did not match the itinerary schema")
+        self._record_parse('stream_itinerary', 'valid')
+        await self.itinerary_cache.aset(
+            self._itinerary_cache_key(destination, preferences),
+            itinerary,
+            metadata={"kind": "itinerary", "name": normalize_key_part(destination)}
+        )
+        yield ('complete', None, itinerary)
+    
+    async def get_destination_highlights(self, destination: str, refresh: bool = False) -> Dict[Any, Any]:
+        """Get special highlights and unique features of a destination (refresh=True bypasses the cache)"""
+        cache_key = self._destination_cache_key('highlights', destination, DESTINATION_HIGHLIGHTS_PROMPT_VERSION)
+        cached = None if refresh else await self.destination_cache.aget(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        flight_key = canonical_request_key('destination_highlights', [destination])
+        return await self.in_flight.do(flight_key, lambda: self._fetch_destination_highlights(destination, cache_key))
+    
+    async def _fetch_destination_highlights(self, destination: str, cache_key: str) -> Dict[Any, Any]:
+        """Call Gemini for destination highlights and cache the result"""
         prompt = f"""
         Provide the special highlights and unique features of {destination} as a tourist destination.
         
@@ -295,10 +1006,13 @@ class GeminiService:
         """
         
         try:
-            response_text = self._generate(prompt)
-            return self._parse_json_response(response_text)
+            result = await self._generate_json(prompt, DestinationHighlights, 'destination_highlights')
+            await self._cache_destination_response('highlights', destination, cache_key, result)
+            return result
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            log.error("Gemini API error: %s", e)
             return {"error": str(e)}
 
 # Create singleton instance
@@ -0,0 +1,140 @@
+"""
+Background health probing.
+
+Load balancers poll the health endpoints every few seconds per instance, so
+those endpoints must not touch Atlas or Gemini themselves. A daemon thread
+refreshes a snapshot every ``interval`` seconds instead: database mode, the
+supervisor's last ping latency and pool usage (no I/O), and whether Gemini
+answers a model metadata request. Liveness and readiness are answered from
+that snapshot.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+from database import probe_status
+from logger import get_logger
+from services.event_loop import run_async
+from services.gemini_service import gemini_service
+
+log = get_logger('health')
+
+
+class HealthProber:
+    """Refreshes a cached health snapshot on a background thread"""
+
+    def __init__(self, service, interval: float = 15, gemini_timeout: float = 5):
+        self.service = service
+        self.interval = interval
+        self.gemini_timeout = gemini_timeout
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _check_gemini(self) -> Dict[str, Any]:
+        """Fetch the model's metadata: proves the key and network work without spending generation quota"""
+        if not Config.GEMINI_API_KEY:
+            return {'status': 'not_configured'}
+        started = time.perf_counter()
+        try:
+            run_async(asyncio.wait_for(
+                self.service.client.aio.models.get(model=self.service.model_name),
+                timeout=self.gemini_timeout
+            ))
+        except Exception as e:
+            return {'status': 'unreachable', 'error': str(e) or type(e).__name__}
+        paused = self.service.rate_limiter.stats()['paused_for_seconds']
+        return {
+            'status': 'rate_limited' if paused > 0 else 'ok',
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            'paused_for_seconds': paused
+        }
+
+    def _publish(self, database: Dict[str, Any], gemini: Dict[str, Any]) -> Dict[str, Any]:
+        if database['mode'] == 'none':
+            status = 'unavailable'
+        elif database['mode'] == 'connecting':
+            status = 'starting'
+        elif database['mode'] == 'fallback' or gemini['status'] not in ('ok', 'pending'):
+            status = 'degraded'
+        else:
+            status = 'healthy'
+        snapshot = {
+            'status': status,
+            'checked_at': datetime.utcnow().isoformat(),
+            'database': database,
+            'gemini': gemini
+        }
+        with self._lock:
+            if status != (self.snapshot or {}).get('status'):
+                log.info("Health status: %s (database: %s, gemini: %s)", status, database['mode'], gemini['status'])
+            self.snapshot = snapshot
+            self._snapshot_at = time.monotonic()
+        return snapshot
+
+    def probe_once(self) -> Dict[str, Any]:
+        """Refresh the snapshot now"""
+        database = probe_status()
+        if self.snapshot is None:
+            # Readiness only depends on storage, so do not wait for Gemini on the first probe
+            self._publish(database, {'status': 'pending'})
+        return self._publish(database, self._check_gemini())
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Whether this instance can serve traffic, and the cached snapshot.
+
+        Ready means storage (MongoDB or the fallback) is usable, or its first
+        connection attempt is still running, and the snapshot is fresh.
+        Gemini problems only degrade the status: every instance shares the
+        same upstream, and cached content still works.
+        """
+        self.start()
+        if self.snapshot is None:
+            # Before the first probe finishes, answer from the database state alone (no I/O)
+            self._publish(probe_status(), {'status': 'pending'})
+        with self._lock:
+            snapshot = self.snapshot
+            age = time.monotonic() - self._snapshot_at
+        snapshot = {**snapshot, 'age_seconds': round(age, 1)}
+        ready = snapshot['status'] != 'unavailable' and age < 3 * self.interval
+        return ready, snapshot
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_once()
+            except Exception as e:
+                log.error("Probe failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the probe thread (once per process, and again after a fork)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="wandrix-health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# Create singleton instance
+health_prober = HealthProber(
+    gemini_service,
+    interval=Config.HEALTH_PROBE_INTERVAL_SECONDS,
+    gemini_timeout=Config.HEALTH_GEMINI_TIMEOUT_SECONDS
+)
@@ -0,0 +1,151 @@
+"""
+Password hashing off the request threads.
+
+scrypt/pbkdf2 hashing is deliberately slow and CPU-bound. Running it on the
+request thread lets a burst of logins starve every other route on the
+worker, so hashes are computed on a small dedicated thread pool (hashlib
+releases the GIL while hashing). At most ``max_pending`` hashes may be
+running or queued; beyond that requests are rejected straight away with a
+retry hint instead of piling up. The hash method is configurable, and
+hashes made with older parameters are reported by ``needs_rehash`` so
+login can upgrade them transparently.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+from services.metrics import counter, gauge, histogram, registry
+
+PASSWORD_HASH_SECONDS = histogram(
+    'wandrix_password_hash_seconds',
+    'Password hashes and checks, including time queued for a hashing thread',
+    ('operation',)
+)
+PASSWORD_HASH_PENDING = gauge('wandrix_password_hash_pending', 'Password hashes running or queued')
+PASSWORD_HASH_REJECTED = counter('wandrix_password_hash_rejected_total', 'Hashes rejected because the queue was full')
+PASSWORD_HASH_REHASHED = counter('wandrix_password_hash_rehashed_total', 'Outdated hashes replaced at login')
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _LatencyStats:
+    """Count, mean, max and recent percentiles of operation latencies"""
+
+    def __init__(self, window: int = 256):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.recent.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 1) if recent else 0.0
+
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max_ms, 1)
+        }
+
+
+class PasswordHasher:
+    """Bounded thread pool for generating and checking password hashes"""
+
+    def __init__(self, method: str = 'scrypt', max_workers: int = 2, max_pending: int = 32):
+        self.method = method
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._current_prefix = None
+        self.rejected = 0
+        self.rehashed = 0
+        self._latency = {'hash': _LatencyStats(), 'verify': _LatencyStats()}
+
+    def _submit(self, kind: str, fn, *args):
+        """Run fn on the pool and wait for it, unless too many hashes are already pending"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                PASSWORD_HASH_REJECTED.inc()
+                raise HasherBusy("Too many sign-in requests in progress, please retry", retry_after=1)
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="wandrix-hash")
+        started = time.perf_counter()
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            elapsed = time.perf_counter() - started
+            PASSWORD_HASH_SECONDS.observe(elapsed, kind)
+            with self._lock:
+                self._pending -= 1
+                self._latency[kind].record(elapsed * 1000)
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method"""
+        return self._submit('hash', generate_password_hash, password, self.method)
+
+    def rehash(self, password: str) -> str:
+        """Hash a password again to replace an outdated hash"""
+        password_hash = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        PASSWORD_HASH_REHASHED.inc()
+        return password_hash
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash (any method werkzeug understands)"""
+        return self._submit('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with different parameters than the configured method"""
+        if self._current_prefix is None:
+            # werkzeug expands bare methods ("scrypt") to their full parameters
+            self._current_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._current_prefix
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'hash_latency': self._latency['hash'].snapshot(),
+                'verify_latency': self._latency['verify'].snapshot()
+            }
+
+
+# Create singleton instance
+password_hasher = PasswordHasher(
+    method=Config.PASSWORD_HASH_METHOD,
+    max_workers=Config.PASSWORD_HASH_WORKERS,
+    max_pending=Config.PASSWORD_HASH_MAX_PENDING
+)
+registry.add_collector(lambda: PASSWORD_HASH_PENDING.set(password_hasher.stats()['pending']))
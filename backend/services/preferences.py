@@ -0,0 +1,123 @@
+"""
+Canonical travel preferences.
+
+Requests that differ only in interest order, casing, budget wording or a
+day or two of trip length get the same answer from Gemini, so they are
+reduced to one canonical form. The canonical form is used both to build
+the prompt and as the cache key, so a cached answer always matches the
+prompt that produced it.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+from services.cache_service import normalize_key_part
+
+# Budget tiers match the options offered by the frontend PreferencesForm
+BUDGET_TIERS = ('budget', 'medium', 'high', 'luxury')
+_BUDGET_ALIASES = {
+    'cheap': 'budget', 'low': 'budget', 'backpacker': 'budget', 'economy': 'budget',
+    'mid': 'medium', 'mid-range': 'medium', 'mid range': 'medium', 'midrange': 'medium',
+    'moderate': 'medium', 'standard': 'medium', 'average': 'medium',
+    'premium': 'high', 'comfort': 'high', 'upscale': 'high',
+    'luxurious': 'luxury', 'ultra': 'luxury', 'ultra-luxury': 'luxury',
+}
+
+_SEASON_ALIASES = {'autumn': 'fall'}
+
+# (upper bound in days, representative duration); trips inside a bucket share one answer
+DURATION_BUCKETS = (
+    (2, 2),
+    (4, 4),
+    (8, 7),
+    (11, 10),
+    (16, 14),
+    (24, 21),
+)
+MAX_DURATION_DAYS = 30
+
+DEFAULT_PREFERENCES = {
+    'budget': 'medium',
+    'travel_duration': 7,
+    'interests': ['general tourism'],
+    'season': 'any',
+    'travel_type': 'solo',
+    'accessibility_needs': 'none',
+}
+
+
+def budget_tier(value: Any) -> str:
+    """Map free-form budget wording onto one of BUDGET_TIERS"""
+    budget = normalize_key_part(value or DEFAULT_PREFERENCES['budget'])
+    if budget in BUDGET_TIERS:
+        return budget
+    return _BUDGET_ALIASES.get(budget, 'medium')
+
+
+def duration_bucket(value: Any) -> int:
+    """Round a trip length to its bucket's representative number of days"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PREFERENCES['travel_duration']
+    days = max(1, days)
+    for upper, representative in DURATION_BUCKETS:
+        if days <= upper:
+            return representative
+    return MAX_DURATION_DAYS
+
+
+def canonical_interests(value: Any) -> List[str]:
+    """Lowercase, deduplicate and sort interests"""
+    if isinstance(value, str):
+        value = value.split(',')
+    interests = sorted({normalize_key_part(v) for v in (value or []) if str(v).strip()})
+    return interests or list(DEFAULT_PREFERENCES['interests'])
+
+
+def canonicalize_preferences(preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a preferences dict to its canonical form (unknown keys are dropped)"""
+    preferences = preferences or {}
+    season = normalize_key_part(preferences.get('season') or DEFAULT_PREFERENCES['season'])
+    return {
+        'budget': budget_tier(preferences.get('budget')),
+        'travel_duration': duration_bucket(preferences.get('travel_duration', DEFAULT_PREFERENCES['travel_duration'])),
+        'interests': canonical_interests(preferences.get('interests')),
+        'season': _SEASON_ALIASES.get(season, season),
+        'travel_type': normalize_key_part(preferences.get('travel_type') or DEFAULT_PREFERENCES['travel_type']),
+        'accessibility_needs': normalize_key_part(
+            preferences.get('accessibility_needs') or DEFAULT_PREFERENCES['accessibility_needs']
+        ),
+    }
+
+
+def canonicalize_itinerary_preferences(preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical form for itinerary requests; the duration is kept exact since it sets the day count"""
+    preferences = preferences or {}
+    try:
+        duration = int(preferences.get('travel_duration', DEFAULT_PREFERENCES['travel_duration']))
+    except (TypeError, ValueError):
+        duration = DEFAULT_PREFERENCES['travel_duration']
+    return {
+        'budget': budget_tier(preferences.get('budget')),
+        'travel_duration': min(MAX_DURATION_DAYS, max(1, duration)),
+        'interests': canonical_interests(preferences.get('interests')),
+        'travel_type': normalize_key_part(preferences.get('travel_type') or DEFAULT_PREFERENCES['travel_type']),
+    }
+
+
+def itinerary_fingerprint(destination: str, preferences: Dict[str, Any]) -> str:
+    """Stable hash of a destination and its canonical itinerary preferences, stored on saved itineraries"""
+    canonical = json.dumps({
+        'destination': normalize_key_part(destination),
+        'preferences': canonicalize_itinerary_preferences(preferences)
+    }, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+
+def ordered_pair(dest1: str, dest2: str) -> Tuple[str, str, bool]:
+    """Order two destinations canonically; the flag says whether they were swapped"""
+    if normalize_key_part(dest2) < normalize_key_part(dest1):
+        return dest2, dest1, True
+    return dest1, dest2, False
@@ -0,0 +1,262 @@
+"""
+Process-wide rate limiting for Gemini calls.
+
+Callers wait in a FIFO queue for a concurrency slot and a token from a
+token bucket. The bucket is either local to the process or, when a state
+file is configured, shared between all workers on the host through an
+fcntl-locked JSON file. A 429 from Gemini pauses the bucket for everyone
+instead of letting each request discover the quota wall on its own.
+"""
+
+import asyncio
+import functools
+import json
+import random
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker state is not supported
+    fcntl = None
+
+log = get_logger('rate_limiter')
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a Gemini call cannot be scheduled within the allowed wait"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(0.0, retry_after)
+
+
+class _LocalTokenBucket:
+    """Token bucket held in process memory"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Take a token; return 0 on success or the seconds to wait otherwise"""
+        now = time.time()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Stop issuing tokens for the given number of seconds"""
+        now = time.time()
+        self._refill(now)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - time.time())
+
+
+class _FileTokenBucket(_LocalTokenBucket):
+    """Token bucket whose state lives in a file shared by all workers on the host"""
+
+    def __init__(self, rate_per_second: float, capacity: float, path: str):
+        super().__init__(rate_per_second, capacity)
+        self.path = path
+
+    def _locked(self, mutate):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                if raw:
+                    try:
+                        state = json.loads(raw)
+                        self.tokens = state['tokens']
+                        self.updated = state['updated']
+                        self.paused_until = state['paused_until']
+                    except (ValueError, KeyError):
+                        pass
+                result = mutate()
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({
+                    'tokens': self.tokens,
+                    'updated': self.updated,
+                    'paused_until': self.paused_until
+                }))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_take(self) -> float:
+        return self._locked(super().try_take)
+
+    def pause(self, seconds: float):
+        return self._locked(functools.partial(super().pause, seconds))
+
+
+class GeminiRateLimiter:
+    """Fair (FIFO) token-bucket and concurrency limiter for the shared event loop"""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        burst: int,
+        max_concurrency: int,
+        max_queue: int,
+        max_wait: float = 30.0,
+        state_file: Optional[str] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        rate = requests_per_minute / 60.0
+        if state_file and fcntl is not None:
+            self.bucket = _FileTokenBucket(rate, burst, state_file)
+        else:
+            if state_file:
+                log.warning("fcntl unavailable - using a per-process token bucket")
+            self.bucket = _LocalTokenBucket(rate, burst)
+        self._shared_bucket = isinstance(self.bucket, _FileTokenBucket)
+        self._loop = None
+        self._waiters = deque()
+        self._active = 0
+        self._dispatcher = None
+        self.rejected = 0
+        self.rate_limited = 0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # New loop (first use or after a fork): drop state tied to the old one
+            self._loop = loop
+            self._waiters = deque()
+            self._active = 0
+            self._dispatcher = None
+
+    def estimated_wait(self) -> float:
+        """Rough seconds until a newly queued call would be dispatched"""
+        rate = self.bucket.rate or 1.0
+        return self.bucket.pause_remaining() + (len(self._waiters) + 1) / rate
+
+    async def acquire(self):
+        """Wait for a concurrency slot and a token, or fail fast when the queue is full"""
+        self._bind_loop()
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise RateLimitExceeded(
+                "Gemini request queue is full, please retry later",
+                retry_after=self.estimated_wait()
+            )
+        eta = self.estimated_wait()
+        if eta > self.max_wait:
+            self.rejected += 1
+            raise RateLimitExceeded(
+                "Gemini is rate limited, please retry later",
+                retry_after=eta
+            )
+
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        self._ensure_dispatcher()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self):
+        """Return a concurrency slot"""
+        self._active = max(0, self._active - 1)
+        self._ensure_dispatcher()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def penalize(self, seconds: float):
+        """Pause all callers after an upstream rate-limit response"""
+        self.rate_limited += 1
+        self.bucket.pause(seconds)
+
+    def _ensure_dispatcher(self):
+        if self._waiters and (self._dispatcher is None or self._dispatcher.done()):
+            self._dispatcher = self._loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while self._waiters:
+            if self._waiters[0].done():
+                self._waiters.popleft()
+                continue
+            if self._active >= self.max_concurrency:
+                # release() restarts the dispatcher when a slot frees up
+                return
+            if self._shared_bucket:
+                wait = await asyncio.to_thread(self.bucket.try_take)
+            else:
+                wait = self.bucket.try_take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._active += 1
+            waiter.set_result(None)
+
+    def stats(self):
+        return {
+            'active': self._active,
+            'queued': len(self._waiters),
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'estimated_wait_seconds': round(self.estimated_wait(), 2),
+            'paused_for_seconds': round(self.bucket.pause_remaining(), 2),
+            'rejected': self.rejected,
+            'rate_limited': self.rate_limited
+        }
+
+
+_RETRY_DELAY_PATTERN = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def retry_after_hint(error) -> Optional[float]:
+    """Extract the server's retryDelay hint from a Gemini error, if any"""
+    match = _RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, hint: Optional[float] = None) -> float:
+    """Jittered exponential backoff that never undercuts the server's hint"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if hint is not None:
+        delay = max(delay, hint + random.uniform(0, 1))
+    return delay
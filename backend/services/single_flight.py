@@ -0,0 +1,98 @@
+"""
+Request coalescing ("single flight") for identical in-flight Gemini calls.
+
+The first caller for a key becomes the leader and runs the upstream call;
+callers arriving with the same key while it is in flight wait on the
+leader's result instead of issuing their own call. Nothing is kept once
+the call finishes - that is the response cache's job.
+"""
+
+import asyncio
+import copy
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from services.cache_service import normalize_key_part
+
+
+def canonical_request_key(
+    endpoint: str,
+    destinations: Iterable[str],
+    preferences: Optional[Dict[str, Any]] = None
+) -> str:
+    """Build a stable key from an endpoint, its destination(s) and preferences"""
+    canonical_prefs = {}
+    for key, value in (preferences or {}).items():
+        if isinstance(value, str):
+            value = normalize_key_part(value)
+        elif isinstance(value, (list, tuple)):
+            value = sorted({normalize_key_part(v) for v in value})
+        canonical_prefs[key] = value
+    return json.dumps({
+        'endpoint': endpoint,
+        'destinations': [normalize_key_part(d) for d in destinations],
+        'preferences': canonical_prefs
+    }, sort_keys=True, default=str)
+
+
+class _Flight:
+    """One upstream call and the number of callers still waiting for it"""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent coroutine calls that share a key (event-loop local)"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]):
+        """
+        Run call() once per key at a time; every caller gets its own deep copy of the result.
+
+        The upstream call runs as its own task that every caller awaits through
+        a shield, so a cancelled caller (client disconnect, timeout) only stops
+        waiting. The task itself is cancelled once the last caller has left.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._in_flight.get(key)
+        if flight is not None and flight.task.get_loop() is loop:
+            self.followers += 1
+        else:
+            flight = _Flight(loop.create_task(call()))
+            self._in_flight[key] = flight
+            flight.task.add_done_callback(lambda task: self._finished(key, flight))
+            self.leaders += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+        # The leader's caller may resume first and modify its result before the followers copy it
+        return copy.deepcopy(result)
+
+    def _finished(self, key: str, flight: _Flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        if not flight.task.cancelled():
+            # Mark as retrieved so a failure nobody waited for doesn't log a warning
+            flight.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            'in_flight': len(self._in_flight),
+            'upstream_calls': self.leaders,
+            'coalesced_calls': self.followers,
+            'coalesced_rate': round(self.followers / total, 4) if total else 0.0
+        }
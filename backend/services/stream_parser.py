@@ -0,0 +1,139 @@
+"""
+Incremental JSON parser for streamed Gemini responses.
+
+Gemini streams a JSON document in arbitrary text chunks. This parser scans
+the chunks as they arrive and reports each top-level field of the root
+object as soon as its value is complete. One top-level array (``days`` for
+itineraries) is reported element by element instead, so a client can render
+day 1 while day 2 is still being generated.
+
+Elements of the streamed array must be objects or arrays; anything before
+the first ``{`` (such as a markdown fence) is ignored. With ``stream_key=None``
+every field is reported whole, which is also how complete fields are
+salvaged from a truncated response.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """Emit ('item', key, value) and ('field', key, value) events from JSON text chunks"""
+
+    def __init__(self, stream_key: Optional[str] = 'days'):
+        self.stream_key = stream_key
+        self.document: Dict[str, Any] = {}
+        self.finished = False
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        # Top-level state: 'key' -> 'colon' -> 'value' -> ('string' | 'scalar' | 'container') -> 'key'
+        self._state = 'key'
+        self._key = None
+        self._token_start = None
+        self._item_start = None
+        self._streaming = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        """Consume a chunk of text and return the events it completed"""
+        self._text += chunk
+        text = self._text
+        events = []
+        i = self._pos
+
+        while i < len(text) and not self.finished:
+            c = text[i]
+
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._state == 'key':
+                            self._key = json.loads(text[self._token_start:i + 1])
+                            self._state = 'colon'
+                        elif self._state == 'string':
+                            self._complete_field(json.loads(text[self._token_start:i + 1]), events)
+                i += 1
+                continue
+
+            if self._depth == 1:
+                self._scan_top_level(c, i, events)
+            else:
+                self._scan_nested(c, i, events)
+            i += 1
+
+        self._pos = i
+        return events
+
+    def _scan_top_level(self, c: str, i: int, events: list):
+        if self._state == 'key':
+            if c == '"':
+                self._in_string = True
+                self._token_start = i
+            elif c == '}':
+                self.finished = True
+        elif self._state == 'colon':
+            if c == ':':
+                self._state = 'value'
+        elif self._state == 'value':
+            if c.isspace():
+                return
+            self._token_start = i
+            if c == '"':
+                self._in_string = True
+                self._state = 'string'
+            elif c in '{[':
+                self._depth += 1
+                self._state = 'container'
+                if c == '[' and self._key == self.stream_key:
+                    self._streaming = True
+                    self.document[self._key] = []
+            else:
+                self._state = 'scalar'
+        elif self._state == 'scalar':
+            if c in ',}':
+                self._complete_field(json.loads(self._text[self._token_start:i].strip()), events)
+                if c == '}':
+                    self.finished = True
+
+    def _scan_nested(self, c: str, i: int, events: list):
+        if c == '"':
+            self._in_string = True
+            self._escape = False
+        elif c in '{[':
+            if self._streaming and self._depth == 2:
+                self._item_start = i
+            self._depth += 1
+        elif c in '}]':
+            self._depth -= 1
+            if self._streaming and self._depth == 2 and self._item_start is not None:
+                item = json.loads(self._text[self._item_start:i + 1])
+                self._item_start = None
+                self.document[self._key].append(item)
+                events.append(('item', self._key, item))
+            elif self._depth == 1:
+                if self._streaming:
+                    self._streaming = False
+                    self._state = 'key'
+                else:
+                    self._complete_field(json.loads(self._text[self._token_start:i + 1]), events)
+
+    def _complete_field(self, value, events: list):
+        self.document[self._key] = value
+        events.append(('field', self._key, value))
+        self._state = 'key'
+        self._key = None
@@ -0,0 +1,128 @@
+"""
+JWT issuing and verification.
+
+A full HS256 decode runs once per token: the user id of a verified
+token is cached under the token's SHA-256 digest until the token
+expires, so repeat requests with the same token are a dictionary hit.
+Tokens that fail verification are remembered for a short while, so clients
+replaying a stale token do not cost a decode (or a log line) each time;
+failure logs are summarised at most once per interval.
+
+Tokens carry a ``kid`` header naming the key that signed them. New tokens
+are signed with the active key; any key in the key set still verifies, so
+``JWT_SECRET`` can be rotated without logging everybody out. Tokens issued
+before key ids existed are verified with the legacy ``JWT_SECRET``.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import jwt
+
+from config import Config
+from logger import get_logger
+from services.cache_service import TTLCache, register_cache
+
+log = get_logger('auth')
+
+
+class TokenVerifier:
+    """Issues and verifies HS256 tokens against a key set, with positive and negative caches"""
+
+    def __init__(
+        self,
+        keys: Dict[str, str],
+        active_kid: str,
+        legacy_secret: Optional[str] = None,
+        cache_size: int = 4096,
+        max_cache_seconds: float = 86400,
+        negative_ttl: float = 60,
+        log_interval: float = 60
+    ):
+        if active_kid not in keys:
+            raise ValueError(f"Active JWT key id {active_kid!r} is not in the key set")
+        self.keys = keys
+        self.active_kid = active_kid
+        self.legacy_secret = legacy_secret
+        self.log_interval = log_interval
+        self.valid = register_cache('tokens', TTLCache(max_entries=cache_size, ttl_seconds=max_cache_seconds))
+        self.invalid = register_cache('invalid_tokens', TTLCache(max_entries=cache_size, ttl_seconds=negative_ttl))
+        self._log_lock = threading.Lock()
+        self._failures_since_log: Dict[str, int] = {}
+        self._last_log = 0.0
+
+    def issue(self, user_id, expiration_hours: float) -> str:
+        """Sign a token for a user with the active key"""
+        now = datetime.utcnow()
+        payload = {
+            'user_id': str(user_id),
+            'exp': now + timedelta(hours=expiration_hours),
+            'iat': now
+        }
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm='HS256', headers={'kid': self.active_kid})
+
+    def verify(self, token: str) -> Optional[str]:
+        """Return the token's user id, or None if it is invalid or expired"""
+        digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+        # Entries live until the token expires, so a hit is always still valid
+        user_id = self.valid.get(digest)
+        if user_id is not None:
+            return user_id
+        if self.invalid.get(digest) is not None:
+            return None
+
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+            secret = self.keys.get(kid) if kid else self.legacy_secret
+            if secret is None:
+                self._reject(digest, 'unknown key id')
+                return None
+            payload = jwt.decode(token, secret, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            self._reject(digest, 'expired')
+            return None
+        except jwt.InvalidTokenError:
+            self._reject(digest, 'invalid')
+            return None
+
+        user_id = payload.get('user_id')
+        if not user_id:
+            self._reject(digest, 'invalid')
+            return None
+        remaining = payload['exp'] - time.time() if 'exp' in payload else self.valid.ttl_seconds
+        self.valid.set(digest, user_id, ttl_seconds=min(self.valid.ttl_seconds, remaining))
+        return user_id
+
+    def _reject(self, digest: str, reason: str):
+        """Remember a bad token and log failures at most once per interval"""
+        self.invalid.set(digest, reason)
+        with self._log_lock:
+            self._failures_since_log[reason] = self._failures_since_log.get(reason, 0) + 1
+            now = time.monotonic()
+            if now - self._last_log < self.log_interval:
+                return
+            summary, self._failures_since_log = self._failures_since_log, {}
+            self._last_log = now
+        details = ', '.join(f"{count} {reason}" for reason, count in sorted(summary.items()))
+        log.info("Rejected tokens since last report: %s", details)
+
+
+def create_token_verifier() -> TokenVerifier:
+    """Build the verifier from the configured key set (JWT_SECRET alone if JWT_KEYS is unset)"""
+    keys = dict(Config.JWT_KEYS) or {'default': Config.JWT_SECRET}
+    return TokenVerifier(
+        keys,
+        Config.JWT_ACTIVE_KID or next(iter(keys)),
+        legacy_secret=Config.JWT_SECRET,
+        cache_size=Config.TOKEN_CACHE_MAX_ENTRIES,
+        max_cache_seconds=Config.JWT_EXPIRATION_HOURS * 3600,
+        negative_ttl=Config.TOKEN_NEGATIVE_CACHE_SECONDS
+    )
+
+
+# Create singleton instance
+token_verifier = create_token_verifier()
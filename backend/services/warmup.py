@@ -0,0 +1,183 @@
+"""
+Pre-warming of content for the popular destinations.
+
+Info, highlights and a few common itinerary variants for every popular
+destination are generated ahead of time and kept in the response caches
+(memory and the destinations collection), so clicking a popular card is
+served from storage. A background thread repeats the run on a schedule and
+only regenerates entries that are missing or close to expiry, spending at
+most ``max_calls`` Gemini calls per run. The budget counts the requests each
+job actually made (a long itinerary is a skeleton plus one call per chunk of
+days, and invalid responses are repaired with further calls); a job is only
+started if its minimum cost still fits, so repairs of the last job are the
+only overshoot. Jobs run one at a time and yield to user traffic waiting in
+the rate limiter.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from services.event_loop import run_async
+from services.preferences import DEFAULT_PREFERENCES
+from services.rate_limiter import RateLimitExceeded
+from logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker warms independently
+    fcntl = None
+
+LOCK_FILE = os.path.join(tempfile.gettempdir(), 'wandrix-warmup.lock')
+
+log = get_logger('warmup')
+
+
+def itinerary_variants(durations: List[int]) -> List[Dict[str, Any]]:
+    """The itinerary preference sets pre-generated for each popular destination"""
+    return [
+        {
+            'travel_duration': duration,
+            'budget': DEFAULT_PREFERENCES['budget'],
+            'interests': list(DEFAULT_PREFERENCES['interests']),
+            'travel_type': DEFAULT_PREFERENCES['travel_type']
+        }
+        for duration in durations
+    ]
+
+
+class PopularContentWarmer:
+    """Keeps cached content for popular destinations fresh within a per-run call budget"""
+
+    def __init__(
+        self,
+        service,
+        destinations: List[Dict[str, Any]],
+        variants: List[Dict[str, Any]],
+        max_calls: int = 30,
+        refresh_before: float = 86400,
+        interval: float = 21600
+    ):
+        self.service = service
+        self.destinations = destinations
+        self.variants = variants
+        self.max_calls = max_calls
+        self.refresh_before = refresh_before
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def _jobs(self) -> List[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        """Every (kind, destination, preferences) to keep warm, most valuable first"""
+        jobs = []
+        for kind in ('info', 'highlights'):
+            jobs.extend((kind, d['name'], None) for d in self.destinations)
+        for preferences in self.variants:
+            jobs.extend(('itinerary', d['name'], preferences) for d in self.destinations)
+        return jobs
+
+    async def _fetch(self, kind: str, destination: str, preferences: Optional[Dict[str, Any]]):
+        if kind == 'info':
+            return await self.service.get_destination_info(destination, refresh=True)
+        if kind == 'highlights':
+            return await self.service.get_destination_highlights(destination, refresh=True)
+        return await self.service.generate_itinerary(destination, preferences, refresh=True)
+
+    async def _yield_to_users(self):
+        """Wait while user requests are queued for Gemini"""
+        while self.service.rate_limiter.stats()['queued'] > 0 and not self._stop.is_set():
+            await asyncio.sleep(1)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Regenerate missing or nearly expired entries; returns a summary of the run"""
+        started = time.time()
+        summary = {'fresh': 0, 'generated': 0, 'failed': 0, 'skipped_budget': 0, 'calls': 0}
+
+        for kind, destination, preferences in self._jobs():
+            remaining = await self.service.cache_ttl_remaining(kind, destination, preferences)
+            if remaining > self.refresh_before:
+                summary['fresh'] += 1
+                continue
+            cost = self.service.minimum_calls(kind, preferences)
+            if summary['calls'] + cost > self.max_calls or self._stop.is_set():
+                summary['skipped_budget'] += 1
+                continue
+
+            await self._yield_to_users()
+            with self.service.count_calls() as calls:
+                try:
+                    result = await self._fetch(kind, destination, preferences)
+                except RateLimitExceeded as e:
+                    log.warning("Rate limited, stopping this run (retry in %.0fs)", e.retry_after)
+                    summary['failed'] += 1
+                    break
+                finally:
+                    summary['calls'] += calls[0]
+            if not result or 'error' in result:
+                summary['failed'] += 1
+                log.warning("Failed to warm %s for %s: %s", kind, destination, (result or {}).get('error'))
+            else:
+                summary['generated'] += 1
+
+        summary['duration_seconds'] = round(time.time() - started, 1)
+        self.last_run = summary
+        log.info("Run complete: %s", summary)
+        return summary
+
+    def run_exclusive(self) -> Optional[Dict[str, Any]]:
+        """Run once unless another worker on this host is already warming"""
+        if fcntl is None:
+            return run_async(self.run_once())
+        with open(LOCK_FILE, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                log.info("Another worker is warming popular content - skipping")
+                return None
+            try:
+                return run_async(self.run_once())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _loop(self, initial_delay: float):
+        if self._stop.wait(initial_delay):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_exclusive()
+            except Exception as e:
+                log.error("Run failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self, initial_delay: float = 0):
+        """Start the background refresh thread (once per process)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop,
+            args=(initial_delay,),
+            name="wandrix-warmup",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_warmer(service, destinations: List[Dict[str, Any]]) -> PopularContentWarmer:
+    """Build a warmer from the configured budget, schedule and itinerary variants"""
+    return PopularContentWarmer(
+        service,
+        destinations,
+        itinerary_variants(Config.WARMUP_ITINERARY_DURATIONS),
+        max_calls=Config.WARMUP_MAX_CALLS_PER_RUN,
+        refresh_before=Config.WARMUP_REFRESH_BEFORE_SECONDS,
+        interval=Config.WARMUP_INTERVAL_SECONDS
+    )
@@ -0,0 +1,168 @@
+"""
+Wishlist storage.
+
+Each wishlist entry is its own document in the wishlists collection, with a
+unique (user_id, name) index, so membership checks are a single index lookup
+and loading a user no longer pulls the whole list. Wishlists embedded in
+user documents by older versions are moved over the first time the user is
+loaded, or all at once with ``flask migrate-wishlists``.
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import get_users_collection, get_wishlists_collection
+from logger import get_logger
+
+log = get_logger('wishlist')
+
+# Entry fields that are storage details rather than part of the destination
+# (the fallback store stamps created_at on every insert)
+_INTERNAL_FIELDS = ('_id', 'user_id', 'created_at')
+
+
+def _user_filter(user_id: str) -> Dict[str, Any]:
+    """Users have ObjectId ids in MongoDB and string ids in the fallback store"""
+    return {"_id": ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id}
+
+
+def _to_destination(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in entry.items() if k not in _INTERNAL_FIELDS}
+
+
+def _encode_cursor(entry: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(f"{entry.get('added_at', '')}|{entry['_id']}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """Return (added_at, _id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        added_at, separator, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not separator:
+        raise ValueError("Invalid cursor")
+    return added_at, ObjectId(entry_id) if ObjectId.is_valid(entry_id) else entry_id
+
+
+def list_wishlist(user_id: str, limit: int = 0, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Return (destinations, next_cursor) in the order they were added.
+
+    limit=0 returns the whole wishlist; next_cursor is None on the last page.
+    """
+    query = {"user_id": user_id}
+    if cursor:
+        added_at, entry_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"added_at": {"$gt": added_at}},
+            {"added_at": added_at, "_id": {"$gt": entry_id}}
+        ]
+
+    entries = get_wishlists_collection().find(query).sort([("added_at", 1), ("_id", 1)])
+    if limit:
+        entries = entries.limit(limit + 1)
+    entries = list(entries)
+
+    next_cursor = None
+    if limit and len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = _encode_cursor(entries[-1])
+    return [_to_destination(entry) for entry in entries], next_cursor
+
+
+def is_in_wishlist(user_id: str, name: str) -> bool:
+    """Single lookup on the unique (user_id, name) index"""
+    return get_wishlists_collection().find_one({"user_id": user_id, "name": name}, {"_id": 1}) is not None
+
+
+def add_to_wishlist(user_id: str, destination: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Add a destination; returns the stored destination, or None if it was already there"""
+    entry = {k: v for k, v in destination.items() if k not in _INTERNAL_FIELDS}
+    entry['added_at'] = datetime.utcnow().isoformat()
+    entry['user_id'] = user_id
+    try:
+        get_wishlists_collection().insert_one(entry)
+    except DuplicateKeyError:
+        return None
+    return _to_destination(entry)
+
+
+def remove_from_wishlist(user_id: str, name: str) -> bool:
+    """Remove a destination; returns whether it was in the wishlist"""
+    return get_wishlists_collection().delete_one({"user_id": user_id, "name": name}).deleted_count > 0
+
+
+def check_many(user_id: str, names: List[str]) -> Dict[str, bool]:
+    """Membership of several destinations in one indexed query"""
+    found = {
+        entry['name']
+        for entry in get_wishlists_collection().find({"user_id": user_id, "name": {"$in": names}}, {"name": 1})
+    }
+    return {name: name in found for name in names}
+
+
+def add_many(user_id: str, destinations: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Add several destinations in one bulk insert; returns (added destinations, names already present)"""
+    added_at = datetime.utcnow().isoformat()
+    entries = {}
+    for destination in destinations:
+        entry = {k: v for k, v in destination.items() if k not in _INTERNAL_FIELDS}
+        entry['added_at'] = added_at
+        entry['user_id'] = user_id
+        entries.setdefault(entry['name'], entry)
+    if not entries:
+        return [], []
+
+    existing = set()
+    try:
+        get_wishlists_collection().insert_many(list(entries.values()), ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            if error.get('code') != 11000:
+                raise
+            existing.add(error['op']['name'])
+    added = [_to_destination(entry) for name, entry in entries.items() if name not in existing]
+    return added, sorted(existing)
+
+
+def remove_many(user_id: str, names: List[str]) -> int:
+    """Remove several destinations in one bulk delete; returns how many were removed"""
+    return get_wishlists_collection().delete_many({"user_id": user_id, "name": {"$in": names}}).deleted_count
+
+
+def migrate_user_wishlist(user_id: str, wishlist: List[Dict[str, Any]]) -> int:
+    """Move a wishlist embedded in a user document into the wishlists collection"""
+    wishlists = get_wishlists_collection()
+    moved = 0
+    for destination in wishlist:
+        if not isinstance(destination, dict) or not destination.get('name'):
+            continue
+        entry = {k: v for k, v in destination.items() if k not in _INTERNAL_FIELDS}
+        entry.setdefault('added_at', '')
+        entry['user_id'] = user_id
+        try:
+            wishlists.insert_one(entry)
+            moved += 1
+        except DuplicateKeyError:
+            # Already moved by an earlier, interrupted run
+            pass
+
+    # Only drop the embedded array once every entry is safely in the collection
+    get_users_collection().update_one(_user_filter(user_id), {"$unset": {"wishlist": ""}})
+    return moved
+
+
+def migrate_all_wishlists() -> Dict[str, int]:
+    """Migrate every user that still has an embedded wishlist"""
+    users = get_users_collection()
+    summary = {'users': 0, 'entries': 0}
+    for user in list(users.find({"wishlist": {"$exists": True}}, {"wishlist": 1})):
+        summary['entries'] += migrate_user_wishlist(str(user['_id']), user.get('wishlist') or [])
+        summary['users'] += 1
+    log.info("Migrated %s entries for %s users", summary['entries'], summary['users'])
+    return summary
@@ -0,0 +1,138 @@
+"""
+Fallback Storage Test Script
+Exercises the file-based and SQLite fallback collections with the queries the API uses
+"""
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import FileBasedCollection, SQLiteCollection
+
+def _exercise(collection, name):
+    print(f"\n-- {name} --")
+    base = datetime(2024, 1, 1)
+    for i in range(30):
+        collection.insert_one({
+            "destination": "Paris" if i % 2 else "Tokyo",
+            "score": i,
+            "tags": ["food", "art"] if i % 3 == 0 else ["nature"],
+            "result": {"winner": "Paris" if i % 5 else "Tokyo"},
+            "created_at": base + timedelta(minutes=i)
+        })
+
+    # Comparison history: newest ten first
+    history = list(collection.find().sort("created_at", -1).limit(10))
+    assert [doc["score"] for doc in history] == list(range(29, 19, -1))
+    print("   sort + limit: OK")
+
+    page = list(collection.find({"destination": "Paris"}).sort("created_at", -1).skip(2).limit(3))
+    assert [doc["score"] for doc in page] == [25, 23, 21]
+    print("   filter + skip: OK")
+
+    assert collection.count_documents({"score": {"$gte": 10, "$lt": 20}}) == 10
+    assert collection.count_documents({"score": {"$in": [1, 2, 99]}}) == 2
+    assert collection.count_documents({"tags": "food"}) == 10
+    assert collection.count_documents({"result.winner": "Tokyo"}) == 6
+    assert collection.count_documents({"$or": [{"score": 0}, {"score": 29}]}) == 2
+    print("   operators: OK")
+
+    projected = collection.find_one({"score": 7}, {"score": 1, "_id": 0})
+    assert projected == {"score": 7}
+    print("   projection: OK")
+
+    # Itinerary lookups arrive as ObjectId
+    inserted = collection.insert_one({"destination": "Rome", "created_at": base})
+    found = collection.find_one({"_id": ObjectId(inserted.inserted_id)})
+    assert found and found["destination"] == "Rome"
+    print("   ObjectId lookup: OK")
+
+    collection.create_index([("slug", 1)], unique=True)
+    collection.insert_one({"slug": "paris"})
+    try:
+        collection.insert_one({"slug": "paris"})
+        raise AssertionError("Duplicate key was accepted")
+    except DuplicateKeyError:
+        pass
+    print("   unique index: OK")
+
+    # Batch wishlist operations
+    try:
+        collection.insert_many([{"slug": "rome"}, {"slug": "paris"}, {"slug": "bali"}], ordered=False)
+        raise AssertionError("Duplicate key was accepted")
+    except BulkWriteError as e:
+        assert [err["op"]["slug"] for err in e.details["writeErrors"]] == ["paris"]
+    assert collection.count_documents({"slug": {"$in": ["rome", "bali"]}}) == 2
+    assert collection.delete_many({"slug": {"$in": ["rome", "bali", "oslo"]}}).deleted_count == 2
+    print("   insert_many + delete_many: OK")
+
+    collection.insert_one({"slug": "list", "tags": ["a"], "items": [{"name": "x"}, {"name": "y"}]})
+    collection.update_one({"slug": "list"}, {
+        "$addToSet": {"tags": {"$each": ["a", "b"]}},
+        "$pull": {"items": {"name": {"$in": ["x"]}}}
+    })
+    updated = collection.find_one({"slug": "list"})
+    assert updated["tags"] == ["a", "b"] and updated["items"] == [{"name": "y"}]
+    print("   $addToSet + $pull $in: OK")
+
+def _exercise_shared_file(tmp):
+    print("\n-- file-based, two processes --")
+    filename = os.path.join(tmp, 'users.json')
+    first = FileBasedCollection(filename, indexes=['email'], compact_threshold=5)
+    first.insert_one({"email": "a@example.com"})
+
+    pid = os.fork()
+    if pid == 0:
+        second = FileBasedCollection(filename, indexes=['email'], compact_threshold=5)
+        ok = second.find_one({"email": "a@example.com"}) is not None
+        for i in range(3):
+            second.insert_one({"email": f"b{i}@example.com"})
+        second.close()
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0, "second process did not see the first one's write"
+
+    # Sees the other process's writes, and compacting here must keep them
+    assert first.find_one({"email": "b2@example.com"}) is not None
+    for i in range(3):
+        first.insert_one({"email": f"c{i}@example.com"})
+    assert first.count_documents() == 7
+    first.close()
+
+    reopened = FileBasedCollection(filename, indexes=['email'])
+    assert reopened.count_documents() == 7
+    assert reopened.find_one({"email": "b0@example.com"}) is not None
+    reopened.close()
+    print("   cross-process writes + compaction: OK")
+
+def test_fallback_storage():
+    print("\n" + "=" * 60)
+    print("FALLBACK STORAGE TEST")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_collection = FileBasedCollection(
+            os.path.join(tmp, 'comparisons.json'),
+            indexes=['created_at', [('destination', 1), ('created_at', -1)]]
+        )
+        _exercise(json_collection, "file-based")
+        json_collection.close()
+        if hasattr(os, 'fork'):
+            _exercise_shared_file(tmp)
+
+        sqlite_collection = SQLiteCollection(
+            os.path.join(tmp, 'fallback.db'), 'comparisons',
+            indexes=['created_at', [('destination', 1), ('created_at', -1)]]
+        )
+        _exercise(sqlite_collection, "sqlite")
+        sqlite_collection.close()
+
+    print("\n" + "=" * 60)
+    print("FALLBACK STORAGE TEST COMPLETE")
+    print("=" * 60 + "\n")
+
+if __name__ == "__main__":
+    test_fallback_storage()
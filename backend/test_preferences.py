@@ -0,0 +1,35 @@
+"""
+Preference Canonicalization Test Script
+Checks that near-identical compare requests share one cache key
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.preferences import canonicalize_preferences, ordered_pair
+
+def test_preferences():
+    print("\n" + "=" * 60)
+    print("PREFERENCE CANONICALIZATION TEST")
+    print("=" * 60 + "\n")
+
+    a = canonicalize_preferences({"budget": "Mid-Range", "travel_duration": 6, "interests": ["Food", "culture "]})
+    b = canonicalize_preferences({"budget": "medium", "travel_duration": "7", "interests": ["culture", "food", "FOOD"]})
+    assert a == b, f"{a} != {b}"
+    print(f"   Canonical form: {a}")
+
+    assert canonicalize_preferences({"travel_duration": 3})["travel_duration"] != a["travel_duration"]
+    assert canonicalize_preferences({"season": "Autumn"})["season"] == "fall"
+    assert canonicalize_preferences({})["interests"] == ["general tourism"]
+    print("   Buckets and defaults: OK")
+
+    assert ordered_pair("Tokyo", "paris") == ("paris", "Tokyo", True)
+    assert ordered_pair("paris", "Tokyo") == ("paris", "Tokyo", False)
+    print("   Symmetric destination order: OK")
+
+    print("\n" + "=" * 60)
+    print("PREFERENCE CANONICALIZATION TEST COMPLETE")
+    print("=" * 60 + "\n")
+
+if __name__ == "__main__":
+    test_preferences()
@@ -0,0 +1,75 @@
+"""
+Single Flight Test Script
+Checks that identical concurrent calls share one upstream call, and that a
+cancelled caller does not fail the others
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.single_flight import SingleFlight
+
+def test_single_flight():
+    print("\n" + "=" * 60)
+    print("SINGLE FLIGHT TEST")
+    print("=" * 60)
+
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def upstream():
+            calls.append(1)
+            await release.wait()
+            return {"value": 42}
+
+        # The leader's caller disconnects; followers must still get the result
+        leader = asyncio.ensure_future(flights.do("key", upstream))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flights.do("key", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        assert results == [{"value": 42}] * 3, results
+        assert len(calls) == 1, calls
+        print("   Leader cancelled, followers served: Yes")
+
+        # When every caller leaves, the upstream call is cancelled
+        release.clear()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await release.wait()
+
+        callers = [asyncio.ensure_future(flights.do("other", slow)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert flights.stats()['in_flight'] == 0
+        print("   Upstream cancelled after last caller left: Yes")
+
+        # Failures reach every caller
+        async def failing():
+            await asyncio.sleep(0)
+            raise ValueError("upstream failed")
+
+        outcomes = await asyncio.gather(*(flights.do("bad", failing) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(o, ValueError) for o in outcomes), outcomes
+        print("   Errors shared: Yes")
+
+    asyncio.run(scenario())
+
+    print("\n" + "=" * 60)
+    print("SINGLE FLIGHT TEST COMPLETE")
+    print("=" * 60 + "\n")
+
+if __name__ == "__main__":
+    test_single_flight()
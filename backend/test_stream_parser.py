@@ -0,0 +1,65 @@
+"""
+Streaming Itinerary Parser Test Script
+Feeds an itinerary to the incremental JSON parser in random chunk sizes
+"""
+import sys
+import os
+import json
+import random
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.stream_parser import IncrementalJSONParser
+
+SAMPLE_ITINERARY = {
+    "destination": "Paris",
+    "duration_days": 3,
+    "overview": "Quotes \" and braces { } inside strings must not confuse the parser",
+    "days": [
+        {
+            "day_number": day,
+            "title": f"Day {day} ]",
+            "morning": {"activity": "Walk", "location": "Seine", "tips": "Bring water"},
+            "meals": {"breakfast": "Cafe", "lunch": "Bistro", "dinner": "Brasserie"}
+        }
+        for day in range(1, 4)
+    ],
+    "total_estimated_cost": "$900",
+    "packing_list": ["Comfortable shoes", "Umbrella"],
+    "emergency_contacts": {"police": "17", "ambulance": "15"}
+}
+
+def test_stream_parser():
+    print("\n" + "=" * 60)
+    print("STREAM PARSER TEST")
+    print("=" * 60 + "\n")
+
+    text = "```json\n" + json.dumps(SAMPLE_ITINERARY, indent=2) + "\n```"
+
+    for trial in range(50):
+        parser = IncrementalJSONParser(stream_key='days')
+        events = []
+        position = 0
+        while position < len(text):
+            size = random.randint(1, 40)
+            events.extend(parser.feed(text[position:position + size]))
+            position += size
+
+        assert parser.finished, "Parser did not reach the end of the document"
+        assert parser.document == SAMPLE_ITINERARY, "Reassembled document differs"
+
+        days = [value for kind, key, value in events if kind == 'item']
+        assert days == SAMPLE_ITINERARY['days'], "Days were not emitted individually"
+
+        # Each day must be emitted before the fields that follow the days array
+        kinds = [(kind, key) for kind, key, value in events]
+        assert kinds.index(('field', 'packing_list')) > kinds.index(('item', 'days'))
+
+    print("   Days emitted incrementally: Yes")
+    print("   Document reassembled: Yes")
+
+    print("\n" + "=" * 60)
+    print("STREAM PARSER TEST COMPLETE")
+    print("=" * 60 + "\n")
+
+if __name__ == "__main__":
+    test_stream_parser()
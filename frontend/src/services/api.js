@@ -73,6 +73,36 @@ export const api = {
     return response.json();
   },
 
+  // Check several destinations at once; returns { in_wishlist: { name: bool } }
+  async checkWishlistBatch(destinationNames) {
+    const response = await fetch(`${API_BASE_URL}/auth/wishlist/check/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...getAuthHeaders() },
+      body: JSON.stringify({ names: destinationNames }),
+    });
+    return response.json();
+  },
+
+  // Add several destinations in one request
+  async addToWishlistBatch(destinations) {
+    const response = await fetch(`${API_BASE_URL}/auth/wishlist/add/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...getAuthHeaders() },
+      body: JSON.stringify({ destinations }),
+    });
+    return response.json();
+  },
+
+  // Remove several destinations in one request
+  async removeFromWishlistBatch(destinationNames) {
+    const response = await fetch(`${API_BASE_URL}/auth/wishlist/remove/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...getAuthHeaders() },
+      body: JSON.stringify({ names: destinationNames }),
+    });
+    return response.json();
+  },
+
   // ==================== DESTINATIONS ====================
 
   // Get destination information
@@ -99,12 +129,22 @@ export const api = {
   async compareDestinations(destination1, destination2, preferences) {
     const response = await fetch(`${API_BASE_URL}/compare`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...getAuthHeaders() },
       body: JSON.stringify({ destination1, destination2, preferences }),
     });
     return response.json();
   },
 
+  // Rank several destinations in one request
+  async compareBatch(destinations, preferences) {
+    const response = await fetch(`${API_BASE_URL}/compare/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ destinations, preferences }),
+    });
+    return response.json();
+  },
+
   // Generate itinerary
   async generateItinerary(destination, preferences) {
     const response = await fetch(`${API_BASE_URL}/itinerary/generate`, {
@@ -127,9 +167,20 @@ export const api = {
     return response.json();
   },
 
-  // Get comparison history
-  async getComparisonHistory() {
-    const response = await fetch(`${API_BASE_URL}/comparisons/history`);
+  // Get comparison history (pass next_cursor from the previous page to go further back)
+  async getComparisonHistory(cursor) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const response = await fetch(`${API_BASE_URL}/comparisons/history${query}`, {
+      headers: { ...getAuthHeaders() },
+    });
+    return response.json();
+  },
+
+  // Get a saved comparison with its full result
+  async getComparison(comparisonId) {
+    const response = await fetch(`${API_BASE_URL}/comparisons/${comparisonId}`, {
+      headers: { ...getAuthHeaders() },
+    });
     return response.json();
   },
 };